@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+# Compares the previous relation rescanning in get_pending_deliveries with core.allocation
+#
+#   python -m benchmarks.allocation
+
+import sys
+import time
+import random
+
+from core import inventory
+from core import allocation
+
+RELATIONS_COUNT = 10000
+ASSETS_COUNT = 50000
+SUBS_COUNT = 500
+
+
+class Record(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def generate_relations(count, subs_count, rng):
+    relations = []
+
+    for i in range(count):
+        user = Record(email='user{}@example.com'.format(i))
+        request = Record(id=i // 3, user=user)
+        product = Record(id=i, app_id=None, store_sub_id=None, sub_id=str(rng.randint(1, subs_count)))
+
+        relations.append(Record(id=i, product=product, request=request))
+
+    return relations
+
+
+def generate_unsent_items(count, subs_count, rng):
+    unsent_items = {}
+
+    for i in range(count):
+        unsent_items.setdefault(str(rng.randint(1, subs_count)), []).append(
+            inventory.InventoryItem('Game', str(1000000000 + i))
+        )
+
+    return unsent_items
+
+
+def allocate_by_rescanning(relation_type, relations, unsent_items, commited_assetids):
+    pending_assets_delivery = []
+
+    for relation in relations:
+        product_sub_id = allocation.get_product_sub_id(relation.product)
+
+        if not unsent_items.get(product_sub_id):
+            continue
+
+        for item in unsent_items[product_sub_id]:
+            if item.assetid in commited_assetids:
+                continue
+
+            commited_assetids.append(item.assetid)
+
+            pending_assets_delivery.append({
+                'relation_type': relation_type,
+                'name': item.name,
+                'relation': relation,
+                'relation_id': relation.id,
+                'assetid': item.assetid,
+                'email': relation.request.user.email,
+                'request_id': relation.request.id
+            })
+
+            break
+
+    return pending_assets_delivery
+
+
+def main():
+    rng = random.Random(0)
+
+    paidrequest_relations = generate_relations(RELATIONS_COUNT // 2, SUBS_COUNT, rng)
+    userrequest_relations = generate_relations(RELATIONS_COUNT // 2, SUBS_COUNT, rng)
+    unsent_items = generate_unsent_items(ASSETS_COUNT, SUBS_COUNT, rng)
+
+    started = time.time()
+    commited_assetids = []
+    rescanned = (
+        allocate_by_rescanning('C', paidrequest_relations, unsent_items, commited_assetids) +
+        allocate_by_rescanning('A', userrequest_relations, unsent_items, commited_assetids)
+    )
+    rescanning_time = time.time() - started
+
+    started = time.time()
+    allocator = allocation.StockAllocator(unsent_items)
+    allocated = (
+        allocator.allocate('C', paidrequest_relations) +
+        allocator.allocate('A', userrequest_relations)
+    )
+    allocator_time = time.time() - started
+
+    print '{0} relations, {1} assets, {2} allocated'.format(RELATIONS_COUNT, ASSETS_COUNT, len(allocated))
+    print 'rescanning {0:8.3f}s'.format(rescanning_time)
+    print 'allocator  {0:8.3f}s ({1:.0f}x)'.format(allocator_time, rescanning_time / allocator_time)
+    print 'same results' if rescanned == allocated else 'RESULTS DIFFER'
+
+    return 0 if rescanned == allocated else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+# Runs track_gifts, accept_gifts and send_gifts against benchmarks.fake_steam with the in-memory
+# steamcommerce_api and config from benchmarks/stubs. Every phase runs in its own process so the
+# peak memory reported is that phase's alone.
+#
+#   python -m benchmarks.end_to_end [items_count ...]
+#
+# BENCHMARK_DB_LATENCY_MS adds a delay to every backend call, BENCHMARK_STEAM_LATENCY_MS to every
+# Steam request, BENCHMARK_PIPELINED_BOOKKEEPING=0 turns the background bookkeeping writer off and
+# BENCHMARK_ACCOUNT_MAX_IN_FLIGHT sets how many Steam calls of the account run at once.
+
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import subprocess
+
+from benchmarks import fake_steam
+
+STUBS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubs')
+
+ITEMS_COUNTS = [100, 1000, 10000, 100000]
+PHASES = ['track_gifts', 'accept_gifts', 'send_gifts']
+OWNER_ID = 1
+
+
+def populate_database(database, scenario):
+    from steamcommerce_api.memory import Query
+    from steamcommerce_api.memory import Record
+
+    sub_ids = scenario.get_unsent_sub_ids()
+    requests = {}
+
+    for i in range(scenario.relations_count):
+        relation_type = 'AC'[i % 2]
+        request_id = i // 6
+
+        if (relation_type, request_id) not in requests:
+            user = Record(name=u'User {}'.format(request_id), email='user{}@example.com'.format(request_id))
+
+            requests[(relation_type, request_id)] = Record(
+                id=request_id,
+                user=user,
+                assigned=None,
+                accepted=False,
+                date=None,
+                paid_date=None,
+                products=Query()
+            )
+
+        request = requests[(relation_type, request_id)]
+        product = Record(id=i, app_id=None, store_sub_id=None, sub_id=str(sub_ids[i % len(sub_ids)]))
+        relation = Record(id=i, product=product, request=request, sent=False, gid=None)
+
+        request.products.append(relation)
+        database.relations[relation_type][i] = relation
+
+    # Gifts sent earlier and still being tracked, a tenth of them left the inventory since
+
+    tracked_assetids = scenario.get_sent_assetids()
+    tracked_assetids += [str(fake_steam.FIRST_ASSETID * 2 + i) for i in range(len(tracked_assetids) // 10)]
+
+    for i, assetid in enumerate(tracked_assetids):
+        database.trackings[i + 1] = Record(
+            id=i + 1,
+            assetid=assetid,
+            completed=False,
+            sent_from_steam_id=fake_steam.STEAM_ID
+        )
+
+        database.tracking_ids[assetid] = i + 1
+
+
+def create_delivery_bot(server_url):
+    import config
+    import requests
+
+    from core import bot
+    from core import vanity
+
+    from steamcommerce_api.cache import cache
+
+    config.STEAM_COMMUNITY_URL = server_url
+    config.STEAM_STORE_URL = server_url
+
+    delivery_bot = bot.DeliveryBot(OWNER_ID, 'benchmark', 'password', 'c2VjcmV0', use_2fa=False)
+
+    session = requests.Session()
+    session.cookies.set('steamLogin', '{}%7C%7Ctoken'.format(fake_steam.STEAM_ID), domain='steamcommunity.com')
+    session.cookies.set('sessionid', 'benchmark', domain='steamcommunity.com')
+    session.cookies.set('sessionid', 'benchmark', domain='store.steampowered.com')
+
+    delivery_bot.web_account.session = session
+    delivery_bot.web_account.transport.set_session(session)
+
+    # Sender vanity names of the pending gift fixtures, so no Steam Web API call is made
+
+    for i in range(7):
+        cache.set(vanity.get_cache_key(u'supplier{}'.format(i)), '7656119800010000{}'.format(i))
+
+    return delivery_bot
+
+
+def run_phase(phase, items_count, server_url):
+    sys.path.insert(0, STUBS_PATH)
+
+    from steamcommerce_api.memory import database
+
+    import config
+
+    database.latency = float(os.environ.get('BENCHMARK_DB_LATENCY_MS', 0)) / 1000
+    config.PIPELINED_BOOKKEEPING = os.environ.get('BENCHMARK_PIPELINED_BOOKKEEPING', '1') != '0'
+
+    if os.environ.get('BENCHMARK_ACCOUNT_MAX_IN_FLIGHT'):
+        config.ACCOUNT_MAX_IN_FLIGHT = int(os.environ['BENCHMARK_ACCOUNT_MAX_IN_FLIGHT'])
+
+    config.SEND_JOURNAL_DIR = tempfile.mkdtemp()
+
+    populate_database(database, fake_steam.Scenario(items_count))
+    delivery_bot = create_delivery_bot(server_url)
+
+    try:
+        started = time.time()
+        getattr(delivery_bot, phase)()
+        elapsed = time.time() - started
+    finally:
+        shutil.rmtree(config.SEND_JOURNAL_DIR)
+
+    return {
+        'elapsed': elapsed,
+        'db_calls': database.calls,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def run_scenario(server, items_count):
+    results = []
+
+    for phase in PHASES:
+        server.take_requests()
+
+        output = subprocess.check_output([
+            sys.executable,
+            '-m',
+            'benchmarks.end_to_end',
+            '--phase',
+            phase,
+            str(items_count),
+            server.url
+        ])
+
+        result = json.loads(output.strip().splitlines()[-1])
+        result['phase'] = phase
+        result['requests'] = sum(server.take_requests().values())
+
+        results.append(result)
+
+    return results
+
+
+def main(argv):
+    if argv[:1] == ['--phase']:
+        print json.dumps(run_phase(argv[1], int(argv[2]), argv[3]))
+
+        return 0
+
+    items_counts = [int(items_count) for items_count in argv] or ITEMS_COUNTS
+
+    print '{0:>8} {1:<14} {2:>10} {3:>9} {4:>9} {5:>12}'.format(
+        'items', 'phase', 'wall (s)', 'requests', 'db calls', 'peak rss MB'
+    )
+
+    for items_count in items_counts:
+        server = fake_steam.FakeSteamServer(
+            fake_steam.Scenario(items_count),
+            latency=float(os.environ.get('BENCHMARK_STEAM_LATENCY_MS', 0)) / 1000
+        ).start()
+
+        try:
+            for result in run_scenario(server, items_count):
+                print '{0:>8} {1:<14} {2:>10.3f} {3:>9} {4:>9} {5:>12.1f}'.format(
+                    items_count,
+                    result['phase'],
+                    result['elapsed'],
+                    result['requests'],
+                    result['db_calls'],
+                    result['peak_rss_kb'] / 1024.0
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+# A local stand-in for the Steam endpoints WebAccount calls, serving a synthetic gift inventory
+
+import re
+import sys
+import json
+import time
+import socket
+import random
+import urlparse
+import threading
+import collections
+import SocketServer
+import BaseHTTPServer
+
+from benchmarks import fixtures
+
+STEAM_ID = '76561198000000001'
+FIRST_ASSETID = 10 ** 10
+FIRST_SUB_ID = 1000
+
+INVENTORY_PATH = re.compile(r'^/inventory/(\d+)/753/1$')
+GIFT_PATH = re.compile(r'^/gifts/(\d+)/(validateunpack|accept|decline)$')
+
+
+class Scenario(object):
+    # Every fifth gift was already sent and every twentieth one has no store link and has to be
+    # unpacked. Pending gifts and relations to deliver scale with the inventory.
+
+    def __init__(self, items_count, seed=0):
+        rng = random.Random(seed)
+
+        self.items_count = items_count
+        self.games_count = max(items_count // 20, 1)
+        self.pending_gifts_count = max(items_count // 100, 1)
+        self.relations_count = max(items_count // 10, 1)
+        self.seed = seed
+
+        self.assets = []
+
+        for i in range(items_count):
+            if i % 5 == 0:
+                kind = 'sent'
+            elif i % 20 == 1:
+                kind = 'unpack'
+            else:
+                kind = 'store'
+
+            self.assets.append((str(FIRST_ASSETID + i), FIRST_SUB_ID + rng.randrange(self.games_count), kind))
+
+        self.sub_ids = dict((assetid, sub_id) for assetid, sub_id, kind in self.assets)
+
+    def get_unsent_sub_ids(self):
+        return sorted(set(sub_id for assetid, sub_id, kind in self.assets if kind != 'sent'))
+
+    def get_sent_assetids(self):
+        return [assetid for assetid, sub_id, kind in self.assets if kind == 'sent']
+
+    def get_description(self, sub_id, kind):
+        description = {
+            'appid': 753,
+            'classid': str(sub_id),
+            'instanceid': str(['store', 'sent', 'unpack'].index(kind)),
+            'name': u'Game {}'.format(sub_id),
+            'type': u'Gift'
+        }
+
+        if kind != 'unpack':
+            description['actions'] = [
+                {'name': 'View in store', 'link': 'http://store.steampowered.com/sub/{}/'.format(sub_id)}
+            ]
+
+        if kind == 'sent':
+            description['owner_descriptions'] = [{'type': 'html', 'value': u'Sent to someone@example.com'}]
+
+        return description
+
+    def get_inventory_page(self, count, start_assetid=None):
+        start = int(start_assetid) - FIRST_ASSETID + 1 if start_assetid else 0
+        page = self.assets[start:start + count]
+
+        descriptions = collections.OrderedDict()
+        assets = []
+
+        for assetid, sub_id, kind in page:
+            description = self.get_description(sub_id, kind)
+            descriptions[(description['classid'], description['instanceid'])] = description
+
+            assets.append({
+                'appid': 753,
+                'contextid': '1',
+                'assetid': assetid,
+                'classid': description['classid'],
+                'instanceid': description['instanceid'],
+                'amount': '1'
+            })
+
+        data = {
+            'assets': assets,
+            'descriptions': descriptions.values(),
+            'total_inventory_count': self.items_count,
+            'success': 1
+        }
+
+        if start + count < self.items_count:
+            data['more_items'] = 1
+            data['last_assetid'] = page[-1][0]
+
+        return data
+
+    def get_pending_gifts_page(self):
+        return fixtures.generate_inventory_page(self.pending_gifts_count, 0, self.seed)
+
+
+class FakeSteamHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type='application/json'):
+        if not isinstance(body, basestring):
+            body = json.dumps(body)
+
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        query = urlparse.parse_qs(url.query)
+        scenario = self.server.scenario
+
+        if INVENTORY_PATH.match(url.path):
+            if self.server.count_request('inventory'):
+                return self.send_error(self.server.errors['inventory'])
+
+            return self.send_body(scenario.get_inventory_page(
+                int(query.get('count', ['2000'])[0]),
+                query.get('start_assetid', [None])[0]
+            ))
+
+        if url.path == '/my/inventory':
+            if self.server.count_request('pendinggifts'):
+                return self.send_error(self.server.errors['pendinggifts'])
+
+            return self.send_body(scenario.get_pending_gifts_page(), 'text/html; charset=utf-8')
+
+        self.send_error(404)
+
+    def do_POST(self):
+        url = urlparse.urlparse(self.path)
+        self.rfile.read(int(self.headers.getheader('Content-Length') or 0))
+
+        match = GIFT_PATH.match(url.path)
+
+        if match and match.group(2) == 'validateunpack':
+            if self.server.count_request('validateunpack'):
+                return self.send_error(self.server.errors['validateunpack'])
+
+            return self.send_body({
+                'success': 1,
+                'packageid': self.server.scenario.sub_ids.get(match.group(1))
+            })
+
+        if match:
+            if self.server.count_request('gifts'):
+                return self.send_error(self.server.errors['gifts'])
+
+            return self.send_body({'success': 1, 'gidgiftnew': str(int(match.group(1)) + FIRST_ASSETID)})
+
+        if url.path == '/checkout/sendgiftsubmit/':
+            if self.server.count_request('sendgiftsubmit'):
+                return self.send_error(self.server.errors['sendgiftsubmit'])
+
+            return self.send_body({'success': 1})
+
+        self.send_error(404)
+
+
+class FakeSteamServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    # errors maps an endpoint to the status code it answers with instead, delays to the seconds
+    # it takes on top of latency. Both can be changed while the server runs.
+
+    daemon_threads = True
+
+    def __init__(self, scenario, address=('127.0.0.1', 0), latency=0):
+        BaseHTTPServer.HTTPServer.__init__(self, address, FakeSteamHandler)
+
+        self.scenario = scenario
+        self.latency = latency
+        self.requests = collections.Counter()
+        self.errors = {}
+        self.delays = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(*self.server_address)
+
+    def count_request(self, endpoint):
+        # Returns True when the request is to be answered with the endpoint's error status
+
+        with self.lock:
+            self.requests[endpoint] += 1
+
+        # Steam's response time, every request waits on its own handler thread
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.delays.get(endpoint):
+            time.sleep(self.delays[endpoint])
+
+        return endpoint in self.errors
+
+    def handle_error(self, request, client_address):
+        # A client that timed out closed the connection before a delayed answer was written
+
+        if isinstance(sys.exc_info()[1], socket.error):
+            return
+
+        BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+    def take_requests(self):
+        with self.lock:
+            requests = self.requests
+            self.requests = collections.Counter()
+
+        return requests
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        return self
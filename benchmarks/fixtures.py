@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import json
+import random
+
+PENDING_GIFT_HTML = u'''
+<div class="pending_gift" id="pending_gift_{gift_id}">
+    <div class="pending_gift_content">
+        <div class="pending_gift_leftcol">
+            <div class="pending_gift_iteminfo" id="pending_gift_iteminfo_{gift_id}"></div>
+            <script type="text/javascript">
+                BuildHover( 'pending_gift_iteminfo_{gift_id}', {gift_json}, UserYou );
+            </script>
+        </div>
+        <div class="pending_gift_rightcol">
+            <p class="gift_from">Gift from <a href="{from_link}">{from_username}</a></p>
+            <p class="gift_note">{note}</p>
+            <div class="gift_controls">
+                <div class="gift_controls_buttons">{buttons}</div>
+            </div>
+        </div>
+    </div>
+</div>
+'''
+
+PENDING_GIFT_BUTTONS_HTML = u'''
+                    <div class="btn_green_white_innerfade btn_medium" onclick="{accept_action}( &quot;{gift_id}&quot;, this );"><span>Accept</span></div>
+                    <div class="btn_grey_white_innerfade btn_medium" onclick="ShowDeclineGiftOptions( &quot;{gift_id}&quot;, this );"><span>Decline</span></div>
+                '''
+
+INVENTORY_ITEM_HTML = u'<div class="itemHolder"><div class="item app753 context1" id="753_1_{assetid}"><img src="https://steamcommunity-a.akamaihd.net/economy/image/{assetid}/96fx96f"></div></div>\n'
+
+
+def generate_pending_gift(gift_id, sub_id):
+    gift_object = {
+        'id': str(gift_id),
+        'name': u'Game {}'.format(sub_id),
+        'name_color': 'D2D2D2',
+        'type': u'Gift',
+        'descriptions': [{'type': 'html', 'value': u'Gift for package {}'.format(sub_id)}],
+        'actions': [{'name': 'View in store', 'link': 'http://store.steampowered.com/sub/{}/'.format(sub_id)}]
+    }
+
+    # Some descriptions carry markup, Steam opens its divs inside the script as they are
+
+    if gift_id % 4 == 1:
+        gift_object['descriptions'][0]['value'] = (
+            u'<div class="bb_h1">Game {}</div><div class="bb_ul"><div>Region free</div></div>'.format(sub_id)
+        )
+
+    if gift_id % 3:
+        from_link = u'https://steamcommunity.com/id/supplier{}'.format(gift_id % 7)
+    else:
+        from_link = u'https://steamcommunity.com/profiles/7656119800000{:04d}'.format(gift_id % 10000)
+
+    # Some gifts come without any button, those are declined
+
+    if gift_id % 11 == 4:
+        buttons = u''
+    else:
+        buttons = PENDING_GIFT_BUTTONS_HTML.format(
+            gift_id=gift_id,
+            accept_action='UnpackGift' if gift_id % 5 == 0 else 'ShowAcceptGiftOptions'
+        )
+
+    return PENDING_GIFT_HTML.format(
+        gift_id=gift_id,
+        gift_json=json.dumps(gift_object).replace(u'</', u'<\\/'),  # closing tags are escaped as Steam does
+        from_link=from_link,
+        from_username=u'Supplier &amp; Co {}'.format(gift_id % 7),
+        note=u'Thanks for your purchase',
+        buttons=buttons
+    )
+
+
+def generate_inventory_page(gifts_count, inventory_items_count=0, seed=0):
+    # An /my/inventory page with gifts_count pending gifts and inventory_items_count unrelated items around them
+
+    rng = random.Random(seed)
+
+    parts = [u'<html><head><title>Steam Community :: Inventory</title></head><body><div id="mainContents">']
+    parts.append(u'<div id="inventories">')
+    parts.extend(
+        INVENTORY_ITEM_HTML.format(assetid=rng.randint(10 ** 9, 10 ** 10))
+        for i in range(inventory_items_count)
+    )
+    parts.append(u'</div>')
+    parts.append(u'<div id="tabcontent_pendinggifts" class="inventory_page_content">')
+    parts.extend(
+        generate_pending_gift(1000000 + i, rng.randint(1, 200000))
+        for i in range(gifts_count)
+    )
+    parts.append(u'</div></div></body></html>')
+
+    return u''.join(parts)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+# Compares the previous dict based inventory parsing with the compact records of core.inventory.
+# Each variant runs in its own process and decodes the pages one at a time like the bot does. Time includes
+# decoding the JSON. Memory is reported as the growth of resident memory once every page was parsed and
+# as the size of the item records kept per unsent gift, strings shared with other objects left out.
+#
+#   python -m benchmarks.inventory_parse
+
+import gc
+import re
+import sys
+import json
+import time
+import resource
+import subprocess
+
+from core import inventory
+
+from benchmarks import fake_steam
+
+ITEMS_COUNTS = [10000, 100000]
+PAGE_SIZE = 2000
+
+
+def generate_pages(items_count):
+    scenario = fake_steam.Scenario(items_count)
+
+    return [
+        json.dumps(scenario.get_inventory_page(PAGE_SIZE, str(fake_steam.FIRST_ASSETID + start - 1) if start else None))
+        for start in range(0, items_count, PAGE_SIZE)
+    ]
+
+
+def parse_with_dicts(pages):
+    unsent_items = {}
+    sent_assetids = set()
+
+    for page in pages:
+        description_indexes = {}
+
+        for description in page.get('descriptions'):
+            description_values = [x.get('value') for x in description.get('owner_descriptions') or []]
+            item_is_sent = 'Sent to' in ''.join(description_values)
+
+            classid_instanceid = '{0}_{1}'.format(description.get('classid'), description.get('instanceid'))
+            description_indexes[classid_instanceid] = (dict(description), item_is_sent)
+
+        for asset in page.get('assets') or []:
+            classid_instanceid = '{0}_{1}'.format(asset.get('classid'), asset.get('instanceid'))
+
+            if classid_instanceid not in description_indexes.keys():
+                continue
+
+            description, item_is_sent = description_indexes[classid_instanceid]
+
+            if item_is_sent:
+                sent_assetids.add(asset.get('assetid'))
+
+                continue
+
+            item_info = {}
+
+            for action in description.get('actions') or []:
+                if action.get('name') != 'View in store':
+                    continue
+
+                item_matches = re.findall(
+                    r'http://store.steampowered.com/(.*?)/([0-9]+)/',
+                    action.get('link'),
+                    re.DOTALL
+                )
+
+                item_info['type'] = item_matches[0][0]
+                item_info['id'] = item_matches[0][1]
+
+            if item_info.get('type') == 'sub':
+                unsent_items.setdefault(str(item_info.get('id')), []).append({
+                    'name': description.get('name'),
+                    'assetid': asset.get('assetid')
+                })
+
+    return unsent_items, sent_assetids
+
+
+def parse_with_records(pages):
+    snapshot = inventory.InventorySnapshot()
+    known_descriptions = {}
+
+    for page in pages:
+        for assetid, description in inventory.iter_page_items(page, known_descriptions):
+            if description.is_sent:
+                snapshot.add_sent(assetid)
+
+                continue
+
+            item_info = description.get_item_info()
+
+            if item_info.get('type') == 'sub':
+                snapshot.add_unsent(item_info.get('id'), description.name, assetid)
+
+    return snapshot.unsent_items, snapshot.sent_assetids
+
+
+def get_rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1024
+
+
+def get_records_size(unsent_items):
+    return sum(
+        sys.getsizeof(items) + sum(sys.getsizeof(item) for item in items)
+        for items in unsent_items.values()
+    )
+
+
+def run_variant(variant, items_count):
+    pages = generate_pages(items_count)
+    parse = parse_with_dicts if variant == 'dicts' else parse_with_records
+
+    gc.collect()
+
+    rss_before = get_rss_kb()
+    started = time.time()
+    unsent_items, sent_assetids = parse(json.loads(page) for page in pages)
+    elapsed = time.time() - started
+
+    gc.collect()
+
+    rss_after = get_rss_kb()
+
+    # A comparable digest of the result, both variants must allocate the same items
+
+    digest = sorted(
+        (sub_id, [item['assetid'] if type(item) is dict else item.assetid for item in items])
+        for sub_id, items in unsent_items.items()
+    )
+
+    return {
+        'elapsed': elapsed,
+        'rss_kb': rss_after - rss_before,
+        'records_kb': get_records_size(unsent_items) / 1024,
+        'digest': hash(repr((digest, sorted(sent_assetids))))
+    }
+
+
+def main(argv):
+    if argv[:1] == ['--variant']:
+        print json.dumps(run_variant(argv[1], int(argv[2])))
+
+        return 0
+
+    same_results = True
+
+    for items_count in [int(items_count) for items_count in argv] or ITEMS_COUNTS:
+        results = {}
+
+        for variant in ['dicts', 'records']:
+            output = subprocess.check_output([
+                sys.executable,
+                '-m',
+                'benchmarks.inventory_parse',
+                '--variant',
+                variant,
+                str(items_count)
+            ])
+
+            results[variant] = json.loads(output.strip().splitlines()[-1])
+
+        dicts, records = results['dicts'], results['records']
+        same_results = same_results and dicts['digest'] == records['digest']
+
+        print '{} items'.format(items_count)
+        print '  dicts   {0:8.3f}s {1:8.1f} MB rss {2:8.1f} MB records'.format(
+            dicts['elapsed'],
+            dicts['rss_kb'] / 1024.0,
+            dicts['records_kb'] / 1024.0
+        )
+        print '  records {0:8.3f}s {1:8.1f} MB rss {2:8.1f} MB records ({3:.1f}x faster)'.format(
+            records['elapsed'],
+            records['rss_kb'] / 1024.0,
+            records['records_kb'] / 1024.0,
+            dicts['elapsed'] / records['elapsed']
+        )
+
+    print 'same results' if same_results else 'RESULTS DIFFER'
+
+    return 0 if same_results else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+# Compares the demiurge/PyQuery pending gift scrape with core.pending
+#
+#   python -m benchmarks.pending_gifts
+
+import re
+import sys
+import json
+import time
+
+from core import items
+from core import pending
+
+from benchmarks import fixtures
+
+SCENARIOS = [
+    (10, 1000),
+    (100, 5000),
+    (1000, 20000)
+]
+
+REPEAT = 3
+
+
+def parse_with_demiurge(html):
+    inventory_matches = items.SteamGiftInventory.all_from(html)
+
+    if not len(inventory_matches):
+        return []
+
+    gifts = []
+
+    for gift in inventory_matches[0].gifts:
+        matches = re.findall(r'BuildHover\( .*, ({.*}), .*\)', gift.gift_javascript, re.DOTALL)
+
+        gifts.append((
+            json.loads(matches[0]) if matches else None,
+            gift.from_link,
+            gift.from_username,
+            gift.accept_button
+        ))
+
+    return gifts
+
+
+def parse_with_scanner(html):
+    return [
+        (gift.gift_object, gift.from_link, gift.from_username, gift.accept_button)
+        for gift in pending.parse_pending_gifts(html) or []
+    ]
+
+
+def measure(parse, html):
+    timings = []
+
+    for i in range(REPEAT):
+        started = time.time()
+        result = parse(html)
+        timings.append(time.time() - started)
+
+    return min(timings), result
+
+
+def main():
+    failed = False
+
+    for gifts_count, inventory_items_count in SCENARIOS:
+        html = fixtures.generate_inventory_page(gifts_count, inventory_items_count)
+
+        demiurge_time, demiurge_gifts = measure(parse_with_demiurge, html)
+        scanner_time, scanner_gifts = measure(parse_with_scanner, html)
+
+        same_results = demiurge_gifts == scanner_gifts
+        failed = failed or not same_results
+
+        print '{0:>5} gifts, {1:>6} items, {2:>6} KB: demiurge {3:8.3f}s scanner {4:8.3f}s ({5:.1f}x) {6}'.format(
+            gifts_count,
+            inventory_items_count,
+            len(html) / 1024,
+            demiurge_time,
+            scanner_time,
+            demiurge_time / scanner_time if scanner_time else 0,
+            'same results' if same_results else 'RESULTS DIFFER'
+        )
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
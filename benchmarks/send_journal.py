@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+# Checks the send journal and DeliveryBot.replay_journal against benchmarks.fake_steam with the
+# in-memory steamcommerce_api and config from benchmarks/stubs. Every check runs in its own process
+# so it starts from an empty cache, database and journal directory.
+#
+#   python -m benchmarks.send_journal [check ...]
+
+import sys
+import shutil
+import tempfile
+import subprocess
+
+from benchmarks import fake_steam
+from benchmarks import end_to_end
+
+ITEMS_COUNT = 100
+ACCOUNT_NAME = 'benchmark'
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+def get_states(send_journal):
+    return dict((assetid, entry.state) for assetid, entry in send_journal.load().items())
+
+
+def get_relation(database, relation_type, kind, scenario, position=0):
+    # The relation of relation_type and the asset of the given kind at position, in id order
+
+    relation = sorted(database.relations[relation_type].values(), key=lambda relation: relation.id)[position]
+    assetid = [assetid for assetid, sub_id, asset_kind in scenario.assets if asset_kind == kind][position]
+
+    return relation, assetid
+
+
+def check_planned_resolution(scenario, server, database):
+    # A planned send whose asset is still unsent did not go out, whether its sub was resolved or not.
+    # One whose asset is gone from the unsent gifts did, it is confirmed without asking Steam again.
+
+    from core import journal
+
+    # Unpacks fail, so the unpack asset is unsent without a resolved sub
+
+    server.errors['validateunpack'] = 500
+
+    delivery_bot = end_to_end.create_delivery_bot(server.url)
+
+    store_relation, store_assetid = get_relation(database, 'C', 'store', scenario)
+    unpack_relation, unpack_assetid = get_relation(database, 'C', 'unpack', scenario, 1)
+    sent_relation, sent_assetid = get_relation(database, 'C', 'sent', scenario, 2)
+
+    for relation, assetid in [
+        (store_relation, store_assetid),
+        (unpack_relation, unpack_assetid),
+        (sent_relation, sent_assetid)
+    ]:
+        delivery_bot.journal.record(journal.Planned, assetid, 'C', relation.request.id, relation.id)
+
+    touched_requests = {}
+
+    delivery_bot.begin_run()
+    delivery_bot.replay_journal(touched_requests)
+
+    states = get_states(delivery_bot.journal)
+
+    expect(states[store_assetid] == journal.Failed, 'unsent store asset is {}'.format(states[store_assetid]))
+    expect(states[unpack_assetid] == journal.Failed, 'unresolved asset is {}'.format(states[unpack_assetid]))
+    expect(states[sent_assetid] == journal.Confirmed, 'sent asset is {}'.format(states[sent_assetid]))
+
+    expect(sent_relation.sent and sent_relation.gid == sent_assetid, 'sent relation was not set sent')
+    expect(not store_relation.sent and not unpack_relation.sent, 'unsent relation was set sent')
+    expect(
+        touched_requests.keys() == [u'C-{}'.format(sent_relation.request.id)],
+        'touched requests are {}'.format(touched_requests.keys())
+    )
+
+
+def check_compaction(scenario, server, database):
+    # Only planned and submitted sends are outstanding, the last state of an asset is the one kept
+
+    from core import journal
+
+    send_journal = journal.SendJournal(ACCOUNT_NAME)
+
+    for state, assetid in [
+        (journal.Planned, '1'),
+        (journal.Submitted, '2'),
+        (journal.Confirmed, '3'),
+        (journal.Failed, '4'),
+        (journal.Planned, '5'),
+        (journal.Submitted, '5'),
+        (journal.Confirmed, '5'),
+        (journal.Submitted, '6'),
+        (journal.Failed, '6'),
+        (journal.Failed, '7'),
+        (journal.Planned, '7')
+    ]:
+        send_journal.record(state, assetid, 'C', 1, int(assetid))
+
+    send_journal.compact()
+
+    expected = {'1': journal.Planned, '2': journal.Submitted, '7': journal.Planned}
+
+    expect(get_states(send_journal) == expected, 'compacted entries are {}'.format(get_states(send_journal)))
+
+    shared = journal.SendJournal(ACCOUNT_NAME).load_shared()
+    local = journal.SendJournal(ACCOUNT_NAME).load_file()
+
+    expect(dict((k, v.state) for k, v in shared.items()) == expected, 'shared log was not compacted')
+    expect(dict((k, v.state) for k, v in local.items()) == expected, 'local file was not compacted')
+
+    with open(send_journal.path) as f:
+        lines = f.readlines()
+
+    expect(len(lines) == len(expected), 'local file kept {} lines'.format(len(lines)))
+
+
+def check_shared_log_expiry(scenario, server, database):
+    # A run that finds the shared log expired restores it from the local file, and a journal
+    # that was loaded before it expired writes every entry again with its next line
+
+    from core import journal
+
+    from steamcommerce_api.cache import cache
+
+    send_journal = journal.SendJournal(ACCOUNT_NAME)
+
+    send_journal.record(journal.Planned, '1', 'C', 1, 1)
+    send_journal.record(journal.Submitted, '2', 'C', 1, 2)
+    send_journal.record(journal.Confirmed, '3', 'C', 1, 3)
+
+    expected = get_states(send_journal)
+
+    cache.values.clear()
+
+    restored = journal.SendJournal(ACCOUNT_NAME)
+
+    expect(get_states(restored) == expected, 'restored entries are {}'.format(get_states(restored)))
+
+    shared = journal.SendJournal(ACCOUNT_NAME).load_shared()
+
+    expect(shared is not None, 'shared log was not restored')
+    expect(dict((k, v.state) for k, v in shared.items()) == expected, 'restored shared log differs')
+
+    cache.values.clear()
+
+    restored.record(journal.Planned, '4', 'C', 1, 4)
+    expected['4'] = journal.Planned
+
+    shared = journal.SendJournal(ACCOUNT_NAME).load_shared()
+
+    expect(shared is not None, 'shared log was not written again')
+    expect(
+        dict((k, v.state) for k, v in shared.items()) == expected,
+        'shared log written again holds {}'.format(sorted(shared.keys()))
+    )
+
+
+def check_unanswered_send(scenario, server, database, failure):
+    # A send Steam did not answer stays planned through the compaction, the next run finds its
+    # asset still unsent and plans it again
+
+    import config
+
+    from core import journal
+
+    if failure == 'error':
+        server.errors['sendgiftsubmit'] = 503
+    else:
+        server.delays['sendgiftsubmit'] = 1
+        config.TRANSPORT_ENDPOINTS = {'sendgiftsubmit': {'timeout': 0.2, 'retries': 0}}
+
+    delivery_bot = end_to_end.create_delivery_bot(server.url)
+    delivery_bot.send_gifts()
+
+    planned = journal.SendJournal(ACCOUNT_NAME).get_entries(journal.Planned)
+    states = set(get_states(delivery_bot.journal).values())
+
+    expect(planned, 'no send was left planned')
+    expect(states == set([journal.Planned]), 'journal states are {}'.format(sorted(states)))
+    expect(
+        not any(relation.sent for relations in database.relations.values() for relation in relations.values()),
+        'a relation was set sent'
+    )
+
+    server.errors.clear()
+    server.delays.clear()
+    config.TRANSPORT_ENDPOINTS = {}
+
+    # The next run is a new process, sharing only the cache and the journal directory
+
+    delivery_bot = end_to_end.create_delivery_bot(server.url)
+    delivery_bot.send_gifts()
+
+    expect(not get_states(delivery_bot.journal), 'journal kept {}'.format(get_states(delivery_bot.journal)))
+
+    for entry in planned:
+        relation = database.relations[entry.relation_type][entry.relation_id]
+
+        expect(relation.sent, 'relation {0}-{1} was not sent'.format(entry.relation_type, entry.relation_id))
+
+
+def check_send_error(scenario, server, database):
+    check_unanswered_send(scenario, server, database, 'error')
+
+
+def check_send_timeout(scenario, server, database):
+    check_unanswered_send(scenario, server, database, 'timeout')
+
+
+CHECKS = [
+    ('planned_resolution', check_planned_resolution),
+    ('compaction', check_compaction),
+    ('shared_log_expiry', check_shared_log_expiry),
+    ('send_error', check_send_error),
+    ('send_timeout', check_send_timeout)
+]
+
+
+def run_check(name):
+    sys.path.insert(0, end_to_end.STUBS_PATH)
+
+    from steamcommerce_api.memory import database
+
+    import config
+
+    config.SEND_JOURNAL_DIR = tempfile.mkdtemp()
+
+    scenario = fake_steam.Scenario(ITEMS_COUNT)
+    end_to_end.populate_database(database, scenario)
+
+    server = fake_steam.FakeSteamServer(scenario).start()
+
+    try:
+        dict(CHECKS)[name](scenario, server, database)
+    except CheckFailed, e:
+        print 'FAILED: {}'.format(e)
+
+        return 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(config.SEND_JOURNAL_DIR)
+
+    return 0
+
+
+def main(argv):
+    if argv[:1] == ['--check']:
+        return run_check(argv[1])
+
+    names = argv or [name for name, check in CHECKS]
+    failed = 0
+
+    for name in names:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.send_journal', '--check', name],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+        output, errors = process.communicate()
+
+        # A check that raised has no FAILED line, the last line of its traceback tells why
+
+        if process.returncode:
+            failed += 1
+            result = (output.strip() or 'FAILED: {}'.format(errors.strip().splitlines()[-1])).splitlines()[-1]
+        else:
+            result = 'ok'
+
+        print '{0:<20} {1}'.format(name, result)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+# Settings used by the end to end benchmark in place of the deployment config.py.
+# The Steam URLs are pointed at the fake server by the benchmark before the bot is created.
+
+BOTS = []
+ROLLBAR_TOKEN = None
+
+STEAM_COMMUNITY_URL = None
+STEAM_STORE_URL = None
+
+# Nothing is throttled, the benchmark measures the bot and not Steam's limits
+
+STEAM_RATE_LIMITS = {
+    'inventory': (10 ** 9, 1),
+    'validateunpack': (10 ** 9, 1),
+    'gifts': (10 ** 9, 1),
+    'sendgiftsubmit': (10 ** 9, 1)
+}
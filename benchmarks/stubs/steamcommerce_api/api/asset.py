@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+from steamcommerce_api.memory import Query
+from steamcommerce_api.memory import Record
+from steamcommerce_api.memory import database
+
+
+class AssetTracking(object):
+    def get_or_create(self, assetid, **kwargs):
+        database.count_call()
+
+        with database.lock:
+            if assetid in database.tracking_ids:
+                return database.tracking_ids[assetid]
+
+            tracking_id = len(database.trackings) + 1
+            database.trackings[tracking_id] = Record(id=tracking_id, assetid=assetid, completed=False, **kwargs)
+            database.tracking_ids[assetid] = tracking_id
+
+        return tracking_id
+
+    def create_history(self, tracking_id, state):
+        database.count_call()
+        database.histories.append((tracking_id, state))
+
+    def update_tracking(self, id=None, **fields):
+        database.count_call()
+        database.trackings[id].__dict__.update(fields)
+
+    def get_uncompleted_trackings(self):
+        database.count_call()
+
+        return Query(tracking for tracking in database.trackings.values() if not tracking.completed)
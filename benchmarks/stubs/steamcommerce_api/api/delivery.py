@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+from steamcommerce_api.memory import Record
+from steamcommerce_api.memory import database
+
+
+class Delivery(object):
+    def get_delivery_config(self):
+        database.count_call()
+
+        return Record(overdue_hour_courtesy=48, generate_overdue_codes=False)
+
+    def get_random_message(self, is_overdue=False):
+        database.count_call()
+
+        return Record(
+            is_overdue=is_overdue,
+            giftee_name=u'{}',
+            gift_message=u'Hi {0}, here is your gift for order {1}',
+            gift_signature=u'Benchmark',
+            gift_sentiment=u'Best Wishes'
+        )
+
+    def generate_overdue_code(self, relation_type, relation_id):
+        database.count_call()
+
+        return u'OVERDUE-{0}-{1}'.format(relation_type, relation_id)
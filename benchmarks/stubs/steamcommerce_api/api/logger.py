@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import logging
+
+
+class Logger(object):
+    # Messages are still formatted by the bot, they are just not written anywhere
+
+    def __init__(self, name, filename):
+        self.logger = logging.getLogger(name)
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.propagate = False
+
+    def get_logger(self):
+        return self.logger
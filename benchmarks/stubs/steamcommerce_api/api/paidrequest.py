@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+from steamcommerce_api.api.requests_base import RequestApi
+
+
+class PaidRequest(RequestApi):
+    relation_type = 'C'
+
+    def accept_paidrequest(self, request_id, owner_id):
+        return self.accept(request_id, owner_id)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+from steamcommerce_api.memory import Query
+from steamcommerce_api.memory import Record
+from steamcommerce_api.memory import database
+
+
+class RequestApi(object):
+    relation_type = None
+
+    def get_relations(self):
+        return database.relations[self.relation_type]
+
+    def get_pending_relations(self, owner_id):
+        database.count_call()
+
+        return Query(
+            relation for relation in self.get_relations().values()
+            if not relation.sent
+        )
+
+    def _get_relation_id(self, relation_id):
+        database.count_call()
+
+        return self.get_relations()[relation_id]
+
+    def set_sent(self, relation_id, gid=None):
+        database.count_call()
+
+        relation = self.get_relations()[relation_id]
+        relation.sent = True
+        relation.gid = gid
+
+    def assign(self, request_id, owner_id):
+        database.count_call()
+
+        for relation in self.get_relations().values():
+            if relation.request.id == request_id:
+                relation.request.assigned = Record(id=owner_id)
+
+    def accept(self, request_id, owner_id):
+        database.count_call()
+
+        for relation in self.get_relations().values():
+            if relation.request.id == request_id:
+                relation.request.accepted = True
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+from steamcommerce_api.api.requests_base import RequestApi
+
+
+class UserRequest(RequestApi):
+    relation_type = 'A'
+
+    def accept_userrequest(self, request_id, owner_id):
+        return self.accept(request_id, owner_id)
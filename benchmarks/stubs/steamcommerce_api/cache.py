@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import time
+import threading
+
+
+class MemoryCache(object):
+    # Same interface as the shared cache, kept in the benchmark process
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value, expires_at = self.values.get(key, (None, None))
+
+            if expires_at and expires_at < time.time():
+                del self.values[key]
+
+                return None
+
+            return value
+
+    def get_many(self, *keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        with self.lock:
+            self.values[key] = (value, time.time() + timeout if timeout else None)
+
+        return True
+
+    def add(self, key, value, timeout=None):
+        with self.lock:
+            if key in self.values:
+                return False
+
+            self.values[key] = (value, time.time() + timeout if timeout else None)
+
+        return True
+
+    def inc(self, key, delta=1):
+        with self.lock:
+            value, expires_at = self.values.get(key, (0, None))
+            self.values[key] = (int(value or 0) + delta, expires_at)
+
+            return self.values[key][0]
+
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+
+        return True
+
+
+cache = MemoryCache()
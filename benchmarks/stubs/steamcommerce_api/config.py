@@ -0,0 +1,4 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+STEAM_API_KEY = 'benchmark'
@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+from enum import IntEnum
+
+
+class EAssetHistoryState(IntEnum):
+    Sent = 1
+    ReturnedToSender = 2
+    MissingFromInventory = 3
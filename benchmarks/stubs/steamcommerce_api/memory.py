@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import time
+import threading
+
+
+class Record(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Query(list):
+    # The subset of a peewee query the bot uses
+
+    def count(self):
+        return len(self)
+
+    def filter(self, **kwargs):
+        return Query(
+            record for record in self
+            if all(getattr(record, field) == value for field, value in kwargs.items())
+        )
+
+
+class Database(object):
+    # In-memory rows behind the stub APIs. calls counts every API call made by the bot and
+    # every call waits latency seconds, like a round trip to the database would.
+
+    def __init__(self):
+        self.relations = {'A': {}, 'C': {}}
+        self.trackings = {}
+        self.tracking_ids = {}
+        self.histories = []
+        self.calls = 0
+        self.latency = 0
+        self.lock = threading.Lock()
+
+    def count_call(self):
+        with self.lock:
+            self.calls += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+
+database = Database()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import logging
+import collections
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+
+def get_product_sub_id(product):
+    if product.app_id and product.store_sub_id:
+        return product.store_sub_id
+    elif product.sub_id:
+        return product.sub_id
+
+    return None
+
+
+class StockAllocator(object):
+    # Keeps a queue of free items per sub_id so every relation is matched in O(1)
+    # and no assetid is handed out twice. Items in excluded_assetids are never handed out.
+
+    def __init__(self, unsent_items, excluded_assetids=()):
+        self.free_items = dict(
+            (str(sub_id), collections.deque(item for item in items if item.assetid not in excluded_assetids))
+            for sub_id, items in unsent_items.items()
+        )
+
+    def allocate_item(self, sub_id):
+        items = self.free_items.get(str(sub_id))
+
+        if not items:
+            return None
+
+        return items.popleft()
+
+    def allocate(self, relation_type, relations):
+        pending_assets_delivery = []
+
+        for relation in relations:
+            product = relation.product
+            product_sub_id = get_product_sub_id(product)
+
+            if not product_sub_id:
+                log.error(u'Product id {} does not contain a store_sub_id'.format(product.id))
+
+                continue
+
+            item = self.allocate_item(product_sub_id)
+
+            if not item:
+                continue
+
+            pending_assets_delivery.append({
+                'relation_type': relation_type,
+                'name': item.name,
+                'relation': relation,
+                'relation_id': relation.id,
+                'assetid': item.assetid,
+                'email': relation.request.user.email,
+                'request_id': relation.request.id
+            })
+
+        return pending_assets_delivery
@@ -5,22 +5,34 @@ import re
 import json
 import time
 import base64
+import urlparse
 import requests
 import datetime
+import functools
+import threading
 
-import steam.guard
-import steam.webauth
-
-from steam import WebAPI
-from steam.enums import EResult
+# EResult is imported by the methods that read a Steam answer, the steam package
+# loads webauth and webapi with their crypto and protobuf dependencies on import
 
 import enums
 import config
 
-from core import items
+from core import unpack
+from core import vanity
+from core import context
+from core import tracking
+from core import transport
+from core import allocation
+from core import pending
+from core import inventory
+from core import lease
+from core import metrics
+from core import writer
+from core import journal
+from core import dispatch
+from core import logs
+from core import stock
 
-from steamcommerce_api import config as backend_config
-from steamcommerce_api.api import logger
 from steamcommerce_api.api import delivery
 from steamcommerce_api.api import userrequest
 from steamcommerce_api.api import paidrequest
@@ -29,7 +41,37 @@ from steamcommerce_api.enums import EAssetHistoryState
 
 from steamcommerce_api.cache import cache
 
-log = logger.Logger('steamcommerce.delivery.bot', 'steamcommerce.delivery.bot.log').get_logger()
+log = logs.log
+
+SESSION_CACHE_TIMEOUT_SECONDS = 12 * 60 * 60
+SESSION_PROBE_TIMEOUT_SECONDS = 10
+INVENTORY_PAGE_SIZE = 2000
+INVENTORY_CACHE_TIMEOUT_SECONDS = 24 * 60 * 60
+TOUCHED_REQUESTS_TIMEOUT_SECONDS = 7 * 24 * 60 * 60
+STEAM_COMMUNITY_URL = 'https://steamcommunity.com'
+STEAM_STORE_URL = 'https://store.steampowered.com'
+PIPELINED_BOOKKEEPING = True
+
+
+def flushes_tracking(phase):
+    # Asset tracking events buffered during a phase are written when it ends, even if it raised
+
+    @functools.wraps(phase)
+    def wrapper(self, *args, **kwargs):
+        try:
+            with metrics.timer('phase_seconds', account=self.account_name, phase=phase.__name__):
+                return phase(self, *args, **kwargs)
+        finally:
+            self.web_account.tracking.flush()
+
+    return wrapper
+
+
+class InventoryFetchError(Exception):
+    def __init__(self, result):
+        super(InventoryFetchError, self).__init__(repr(result))
+
+        self.result = result
 
 
 class WebAccount(object):
@@ -38,19 +80,53 @@ class WebAccount(object):
         self.password = password
         self.shared_secret = shared_secret
         self.use_2fa = use_2fa
-
-        self.lock_cache_key = 'bot/lock/{0}'.format(self.account_name)
+        self.session = None
+        self.community_url = getattr(config, 'STEAM_COMMUNITY_URL', STEAM_COMMUNITY_URL)
+        self.store_url = getattr(config, 'STEAM_STORE_URL', STEAM_STORE_URL)
+        self.transport = transport.Transport(account_name=account_name)
+        self.tracking = tracking.TrackingBuffer(account_name=account_name)
+        self.context = context.RunContext(account_name=account_name)
+
+        self.lock_cache_key = lease.get_bot_lock_key(self.account_name)
+        self.session_cache_key = 'bot/session/{0}'.format(self.account_name)
+        self.inventory_cache_key = 'delivery/inventory/{0}'.format(self.account_name)
+        self.lock = lease.Lease(self.lock_cache_key)
+        self.login_lock = threading.Lock()
 
     def lock_is_present(self):
-        return bool(cache.get(self.lock_cache_key) or 0)
+        return self.lock.is_present()
+
+    def lock_is_held(self):
+        return self.lock.is_held()
 
     def acquire_lock(self):
-        cache.set(self.lock_cache_key, 1, timeout=10 * 60)
+        return self.lock.acquire()
 
     def release_lock(self):
-        cache.delete(self.lock_cache_key)
+        self.lock.release()
+
+    def log_rate_limit_waits(self):
+        waited = self.transport.limiter.waited
+
+        for endpoint in sorted(waited.keys()):
+            log.info(
+                u'{0} waited {1:.2f} seconds on the {2} rate limit'.format(
+                    self.account_name,
+                    waited[endpoint],
+                    endpoint
+                )
+            )
 
     def init_session(self):
+        if self.restore_session():
+            log.info(u'Reusing stored session for account name {}'.format(self.account_name))
+
+            return True
+
+        return self.login()
+
+    @metrics.timed('step_seconds', step='login')
+    def login(self):
         log.info(
             u'Initializing session for account_name {0}. USE 2FA: {1}'.format(
                 self.account_name,
@@ -58,6 +134,10 @@ class WebAccount(object):
             )
         )
 
+        # Imported here, a run that reuses the cached session never loads the crypto behind it
+
+        import steam.webauth
+
         user = steam.webauth.WebAuth(self.account_name, self.password)
 
         if self.use_2fa:
@@ -73,51 +153,166 @@ class WebAccount(object):
             log.info(u'Logging into account {}'.format(self.account_name))
             session = user.login()
 
+        self.session = session
+        self.transport.set_session(session)
+
         log.info(u'Logged in, getting store sites for cookie setting')
 
-        session.get('http://store.steampowered.com')
-        session.get('https://store.steampowered.com')
+        self.transport.request('session', 'get', 'http://store.steampowered.com')
+        self.transport.request('session', 'get', 'https://store.steampowered.com')
 
-        self.session = session
+        self.store_session()
 
         log.info(u'Session for account name {} has been set'.format(self.account_name))
 
         return True
 
+    def store_session(self):
+        cookies = [
+            {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'secure': cookie.secure
+            } for cookie in self.session.cookies
+        ]
+
+        cache.set(
+            self.session_cache_key,
+            json.dumps(cookies),
+            timeout=getattr(config, 'SESSION_CACHE_TIMEOUT_SECONDS', SESSION_CACHE_TIMEOUT_SECONDS)
+        )
+
+    def restore_session(self):
+        cached = cache.get(self.session_cache_key)
+
+        if not cached:
+            return False
+
+        session = requests.Session()
+
+        for cookie in json.loads(cached):
+            session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie['domain'],
+                path=cookie['path'],
+                secure=cookie['secure']
+            )
+
+        if not self.session_is_valid(session):
+            log.info(u'Stored session for account name {} was rejected'.format(self.account_name))
+
+            cache.delete(self.session_cache_key)
+
+            return False
+
+        self.session = session
+        self.transport.set_session(session)
+
+        return True
+
+    def session_is_valid(self, session):
+        try:
+            req = session.get(
+                '{0}/chat/clientjstoken'.format(self.community_url),
+                allow_redirects=False,
+                timeout=getattr(config, 'SESSION_PROBE_TIMEOUT_SECONDS', SESSION_PROBE_TIMEOUT_SECONDS)
+            )
+        except Exception, e:
+            log.error(u'Unable to probe session for {0}. Raised: {1}'.format(self.account_name, e))
+
+            return False
+
+        if req.status_code != 200:
+            return False
+
+        try:
+            data = req.json()
+        except ValueError:
+            return False
+
+        return bool(data.get('logged_in'))
+
+    def session_was_rejected(self, req):
+        if req.status_code == 401:
+            return True
+
+        # Steam answers expired sessions with a redirect to the login page. Only the path is checked,
+        # a vanity URL such as /id/loginov/inventory is a normal redirect
+
+        return bool(req.history) and urlparse.urlparse(req.url).path.startswith('/login')
+
+    def get_session_id(self, domain='steamcommunity.com'):
+        return self.session.cookies.get('sessionid', domain=domain)
+
+    def request(self, endpoint, method, url, sessionid_field=None, sessionid_domain='steamcommunity.com', **kwargs):
+        # Returns the response or a WebAccountResult from the transport. sessionid_field names the form
+        # field carrying the sessionid cookie, it is filled here so it still matches after a transparent re-login
+
+        for attempt in range(2):
+            session = self.session
+
+            if sessionid_field:
+                kwargs['data'][sessionid_field] = self.get_session_id(domain=sessionid_domain)
+
+            req = self.transport.request(endpoint, method, url, **kwargs)
+
+            if type(req) is enums.WebAccountResult or attempt or not self.session_was_rejected(req):
+                return req
+
+            # Concurrent requests of the account see the same rejection, only the first one logs in again
+
+            with self.login_lock:
+                if self.session is session:
+                    log.info(u'Session for account name {} was rejected, logging in again'.format(self.account_name))
+
+                    cache.delete(self.session_cache_key)
+                    self.login()
+
+        return req
+
     def get_steam_id_from_cookies(self):
         return self.session.cookies.get('steamLogin', domain='steamcommunity.com').rsplit('%7C')[0]
 
     def generate_two_factor_code(self):
+        import steam.guard
+
         return steam.guard.generate_twofactor_code_for_time(
             base64.b64decode(self.shared_secret),
             time.time()
         )
 
-    def get_steam_inventory(self, steam_id, app_id, context_id, language='english', count=5000):
-        try:
-            req = self.session.get(
-                'http://steamcommunity.com/inventory/{0}/{1}/{2}?l={3}&count={4}'.format(
-                    steam_id,
-                    app_id,
-                    context_id,
-                    language,
-                    count,
-                    timeout=config.INVENTORY_DEFAULT_TIMEOUT_SECONDS
-                )
-            )
-        except requests.exceptions.Timeout:
-            return enums.WebAccountResult.Timeout
-        except Exception, e:
+    def get_steam_inventory(self, steam_id, app_id, context_id, language='english', count=INVENTORY_PAGE_SIZE,
+                            start_assetid=None):
+        req = self.request(
+            'inventory',
+            'get',
+            '{0}/inventory/{1}/{2}/{3}'.format(
+                self.community_url,
+                steam_id,
+                app_id,
+                context_id
+            ),
+            params={
+                'l': language,
+                'count': count,
+                'start_assetid': start_assetid
+            }
+        )
+
+        if type(req) is enums.WebAccountResult:
             log.error(
-                u'Unable to retrieve inventory app_id {0} context_id {1} for steamid {2}. Raised: {3}'.format(
+                u'Unable to retrieve inventory app_id {0} context_id {1} for steamid {2}. Received: {3}'.format(
                     app_id,
                     context_id,
                     steam_id,
-                    e
+                    repr(req)
                 )
             )
 
-            return enums.WebAccountResult.UnknownException
+            return req
 
         try:
             data = req.json()
@@ -128,64 +323,83 @@ class WebAccount(object):
 
         return data
 
-    def item_description_is_sent(self, owner_descriptions):
-        description_values = [x.get('value') for x in owner_descriptions or []]
+    def iter_steam_inventory(self, steam_id, app_id, context_id, fingerprint=None):
+        # Follows the more_items/last_assetid cursor so only one page is held in memory at a time
 
-        return 'Sent to' in ''.join(description_values)
+        start_assetid = None
+        known_descriptions = {}
 
-    def get_description_indexes(self, descriptions, filter_sent=True):
-        # The description index dictionary is to point from a classid_instanceid key to a description
+        while True:
+            inventory_data = self.get_steam_inventory(
+                steam_id,
+                app_id,
+                context_id,
+                start_assetid=start_assetid
+            )
 
-        description_indexes = {}
-        log.info(u'Generating description indexes for {} descriptions'.format(len(descriptions)))
+            if type(inventory_data) is enums.WebAccountResult:
+                raise InventoryFetchError(inventory_data)
 
-        for description in descriptions:
-            item_is_sent = self.item_description_is_sent(description.get('owner_descriptions'))
+            if not inventory_data.get('success'):
+                raise InventoryFetchError(enums.WebAccountResult.Failed)
 
-            if filter_sent and item_is_sent:
-                continue
-            elif not filter_sent and not item_is_sent:
-                continue
+            if not start_assetid:
+                log.info(
+                    u'Steam inventory total inventoy count is {}'.format(
+                        inventory_data.get('total_inventory_count')
+                    )
+                )
+
+            if not inventory_data.get('descriptions'):
+                log.error(
+                    u'Inventory data did not contain any descriptions. Possible steam failure'
+                )
 
-            classid_instanceid = '{0}_{1}'.format(
-                description.get('classid'),
-                description.get('instanceid')
+                raise InventoryFetchError(enums.WebAccountResult.Failed)
+
+            log.info(
+                u'Parsing {} inventory descriptions'.format(len(inventory_data.get('descriptions')))
             )
 
-            description_indexes[classid_instanceid] = dict(description)
+            for assetid, description in inventory.iter_page_items(inventory_data, known_descriptions, fingerprint):
+                yield assetid, description
+
+            if not inventory_data.get('more_items'):
+                return
 
-        return description_indexes
+            start_assetid = inventory_data.get('last_assetid')
 
-    def get_item_info_from_unpack(self, assetid):
-        cache_key = 'delivery/validateunpack/{}'.format(assetid)
-        cached = cache.get(cache_key)
+    def request_item_unpack(self, assetid):
+        unpack_data = self.validate_unpack(assetid)
 
-        if cached:
-            return json.loads(cached)
+        if type(unpack_data) == dict:
+            unpack.UnpackCache().set(assetid, unpack_data)
+        else:
+            unpack.UnpackCache().set_failure(assetid, unpack_data)
+
+        return unpack_data
 
+    def validate_unpack(self, assetid):
         log.info(u'Validate unpack for assetid {}'.format(assetid))
 
-        try:
-            req = self.session.post(
-                'http://steamcommunity.com/gifts/{}/validateunpack'.format(assetid),
-                data={
-                    'sessionid': self.session.cookies.get(
-                        'sessionid',
-                        domain='steamcommunity.com'
-                    )
-                }
-            )
-        except requests.exceptions.Timeout:
-            return enums.WebAccountResult.Timeout.value
-        except Exception, e:
+        req = self.request(
+            'validateunpack',
+            'post',
+            '{0}/gifts/{1}/validateunpack'.format(self.community_url, assetid),
+            sessionid_field='sessionid',
+            data={}
+        )
+
+        if type(req) is enums.WebAccountResult:
             log.error(
-                u'Unable to call item unpack for assetid {0} Raised: {1}'.format(
+                u'Unable to call item unpack for assetid {0} Received: {1}'.format(
                     assetid,
-                    e
+                    repr(req)
                 )
             )
 
-            return enums.WebAccountResult.UnknownException.value
+            return req.value
+
         try:
             data = req.json()
         except ValueError:
@@ -196,167 +410,137 @@ class WebAccount(object):
         if not data.get('success'):
             return enums.WebAccountResult.Failed.value
 
-        unpack_data = {
+        return {
             'type': 'sub',
             'id': data.get('packageid')
         }
 
-        cache.set(cache_key, json.dumps(unpack_data))
-
-        return unpack_data
-
-    def get_item_info(self, actions, assetid):
-        item_info = {}
-
-        if actions and len(actions):
-            # Get item info from actions
+    @metrics.timed('step_seconds', step='inventory')
+    def get_inventory_items(self):
+        steam_id = self.get_steam_id_from_cookies()
+        app_id = 753
+        context_id = 1
 
-            for action in actions:
-                action_name = action.get('name')
-                action_link = action.get('link')
+        log.info(u'Getting steam gift inventory for {}'.format(self.account_name))
 
-                if action_name != 'View in store':
-                    continue
+        snapshot = inventory.InventorySnapshot()
+        fingerprint = inventory.InventoryFingerprint()
 
-                item_matches = re.findall(
-                    r'http://store.steampowered.com/(.*?)/([0-9]+)/',
-                    action_link,
-                    re.DOTALL
-                )
+        log.info(u'Parsing steam inventory assets')
 
-                if not len(item_matches):
-                    log.error(u'Could not match item information from link {}'.format(action_link))
+        steam_inventory = self.iter_steam_inventory(steam_id, app_id, context_id, fingerprint)
 
-                    break
+        # Assets whose sub cannot be read from their store link are resolved in one batch afterwards
 
-                item_match = item_matches[0]
+        unpack_names = {}
 
-                item_info['type'] = item_match[0]
-                item_info['id'] = item_match[1]
-        else:
-            # Get item info from unpack
+        try:
+            for assetid, description in steam_inventory:
+                if description.is_sent:
+                    # Sent gifts are only tracked by assetid, there is no need to resolve them
 
-            item_info = self.get_item_info_from_unpack(assetid)
+                    snapshot.add_sent(assetid)
 
-        return item_info
+                    continue
 
-    def get_inventory_items(self, filter_sent=True):
-        steam_id = self.get_steam_id_from_cookies()
-        app_id = 753
-        context_id = 1
+                snapshot.add_unsent_asset(assetid)
 
-        log.info(u'Getting steam gift inventory for {}'.format(self.account_name))
+                item_info = description.get_item_info()
 
-        inventory_data = self.get_steam_inventory(steam_id, app_id, context_id)
+                if item_info.get('type') == 'sub':
+                    snapshot.add_unsent(item_info.get('id'), description.name, assetid)
+                else:
+                    # To be absolutely sure get apps from unpacking their assetid and the match it against store_sub_id
 
-        if type(inventory_data) is enums.WebAccountResult:
-            return inventory_data
+                    unpack_names[assetid] = description.name
+        except InventoryFetchError, e:
+            return e.result
 
-        if not inventory_data.get('success'):
-            return enums.WebAccountResult.Failed
+        snapshot.fingerprint = fingerprint.hexdigest()
 
-        log.info(
-            u'Steam inventory total inventoy count is {}'.format(
-                inventory_data.get('total_inventory_count')
-            )
-        )
+        # The same assets as the last fetch resolve to the same subs, the stored map spares the unpack step
 
-        if not inventory_data.get('descriptions'):
-            log.error(
-                u'Inventory data did not contain any descriptions. Possible steam failure'
-            )
+        unsent_items = self.get_cached_unsent_items(snapshot.fingerprint)
 
-            return enums.WebAccountResult.Failed
+        if unsent_items is not None:
+            log.info(u'Inventory of {} is unchanged, reusing its resolved items'.format(self.account_name))
 
-        description_indexes = self.get_description_indexes(
-            inventory_data.get('descriptions'),
-            filter_sent=filter_sent
-        )
+            snapshot.unsent_items = unsent_items
 
-        items = {}
+            return snapshot
 
-        log.info(u'Parsing steam inventory assets')
+        unpack_failures = 0
 
-        for asset in inventory_data.get('assets'):
-            classid_instanceid = '{0}_{1}'.format(
-                asset.get('classid'),
-                asset.get('instanceid')
-            )
+        with metrics.timer('step_seconds', account=self.account_name, step='unpack'):
+            unpacked = unpack.UnpackResolver(self).resolve(unpack_names.keys())
 
-            if classid_instanceid not in description_indexes.keys():
-                continue
+        for assetid, name in unpack_names.items():
+            unpack_info = unpacked.get(assetid)
 
-            description = description_indexes[classid_instanceid]
-
-            item_info = self.get_item_info(
-                description.get('actions'),
-                asset.get('assetid')
-            )
-
-            if type(item_info) == enums.WebAccountResult:
+            if type(unpack_info) != dict:
                 log.error(
-                    u'Failed to retrieve item information for {0}, received {1}'.format(
-                        asset.get('assetid'),
-                        repr(item_info)
+                    u'Failed to unpack item information for {0}, received {1}'.format(
+                        assetid,
+                        repr(unpack_info)
                     )
                 )
 
+                unpack_failures += 1
+
                 continue
 
-            # Wipe variables from previous iterations
+            snapshot.add_unsent(unpack_info.get('id'), name, assetid)
 
-            app_id = None
-            sub_id = None
+        # A map missing failed unpacks is not stored, they are retried on the next fetch
 
-            if item_info.get('type') == 'app':
-                # To be absolutely sure get apps from unpacking their assetid and the match it against store_sub_id
+        if not unpack_failures:
+            self.store_unsent_items(snapshot)
 
-                unpack_info = self.get_item_info_from_unpack(asset.get('assetid'))
+        return snapshot
 
-                if type(unpack_info) != dict:
-                    log.error(u'Failed to unpack item information for {}'.format(asset.get('assetid')))
+    def get_cached_unsent_items(self, fingerprint):
+        cached = cache.get(self.inventory_cache_key)
 
-                    continue
+        if not cached:
+            return None
 
-                sub_id = unpack_info.get('id')
-            elif item_info.get('type') == 'sub':
-                sub_id = item_info.get('id')
+        data = json.loads(cached)
 
-            if str(sub_id) not in items.keys():
-                items[str(sub_id)] = []
+        if data.get('fingerprint') != fingerprint:
+            return None
 
-            items[str(sub_id)].append({
-                'name': description.get('name'),
-                'assetid': asset.get('assetid')
-            })
+        return inventory.load_unsent_items(data.get('unsent_items'))
 
-        return items
+    def store_unsent_items(self, snapshot):
+        cache.set(
+            self.inventory_cache_key,
+            json.dumps({
+                'fingerprint': snapshot.fingerprint,
+                'unsent_items': inventory.dump_unsent_items(snapshot.unsent_items)
+            }),
+            timeout=INVENTORY_CACHE_TIMEOUT_SECONDS
+        )
 
     def decline_gift(self, gift_id, sender_steam_id, decline_note='Auto-declined'):
-        try:
-            req = self.session.post(
-                'http://steamcommunity.com/gifts/{0}/decline'.format(gift_id),
-                data={
-                    'note': decline_note,
-                    'steamid_sender': sender_steam_id,
-                    'sessionid': self.session.cookies.get(
-                        'sessionid',
-                        domain='steamcommunity.com'
-                    )
-                }
-            )
-        except requests.exceptions.Timeout:
-            log.error(
-                u'Could not decline gift with gift id {}. Request timed out'.format(gift_id)
-            )
+        from steam.enums import EResult
 
-            return enums.WebAccountResult.Timeout
-        except Exception, e:
+        req = self.request(
+            'gifts',
+            'post',
+            '{0}/gifts/{1}/decline'.format(self.community_url, gift_id),
+            sessionid_field='sessionid',
+            data={
+                'note': decline_note,
+                'steamid_sender': sender_steam_id
+            }
+        )
+
+        if type(req) is enums.WebAccountResult:
             log.error(
-                u'Could not decline gift with gift id {0}. Raised {1}'.format(gift_id, e)
+                u'Could not decline gift with gift id {0}. Received {1}'.format(gift_id, repr(req))
             )
 
-            return enums.WebAccountResult.UnknownException
+            return req
 
         if req.status_code != 200:
             log.error(
@@ -380,37 +564,27 @@ class WebAccount(object):
         if response == EResult.OK:
             log.info(u'Declined gift succesfuly')
 
-            tracking_id = asset_api.AssetTracking().get_or_create(gift_id)
-
-            asset_api.AssetTracking().create_history(tracking_id, EAssetHistoryState.ReturnedToSender)
+            self.tracking.record(assetid=gift_id, state=EAssetHistoryState.ReturnedToSender)
 
         return response
 
     def accept_gift(self, gift_id, sender_steam_id):
-        try:
-            req = self.session.post(
-                'http://steamcommunity.com/gifts/{0}/accept'.format(
-                    gift_id
-                ),
-                data={
-                    'sessionid': self.session.cookies.get(
-                        'sessionid',
-                        domain='steamcommunity.com'
-                    )
-                }
-            )
-        except requests.exceptions.Timeout:
-            log.error(
-                u'Could not accept gift with gift_id {}. Request timed out'.format(gift_id)
-            )
+        from steam.enums import EResult
+
+        req = self.request(
+            'gifts',
+            'post',
+            '{0}/gifts/{1}/accept'.format(self.community_url, gift_id),
+            sessionid_field='sessionid',
+            data={}
+        )
 
-            return enums.WebAccountResult.Timeout
-        except Exception, e:
+        if type(req) is enums.WebAccountResult:
             log.error(
-                u'Could not accept gift with gift_id {0}. Raised {1}'.format(gift_id, e)
+                u'Could not accept gift with gift_id {0}. Received {1}'.format(gift_id, repr(req))
             )
 
-            return enums.WebAccountResult.UnknownException
+            return req
 
         if req.status_code != 200:
             log.error(
@@ -431,45 +605,34 @@ class WebAccount(object):
 
         result = EResult(data.get('success'))
 
+        metrics.increment('gifts_accepted_total', account=self.account_name, result=result.name)
+
         if result == EResult.OK:
             assetid = data.get('gidgiftnew')
 
             log.info(u'Accepted gift succesfuly. New assetid is {}'.format(assetid))
 
-            tracking_id = asset_api.AssetTracking().get_or_create(assetid)
-
-            asset_api.AssetTracking().create_history(
-                tracking_id,
-                EAssetHistoryState.ReturnedToSender
-            )
-
-            asset_api.AssetTracking().update_tracking(
-                id=tracking_id,
+            self.tracking.record(
+                assetid=assetid,
+                state=EAssetHistoryState.ReturnedToSender,
                 received_from_steam_id=sender_steam_id
             )
 
         return result
 
+    @metrics.timed('step_seconds', step='pending_gifts')
     def get_pending_gifts(self):
-        try:
-            req = self.session.get('https://steamcommunity.com/my/inventory')
-        except requests.exceptions.Timeout:
-            log.error(
-                u'Unable to get user inventory for account {}. Request timed out'.format(
-                    self.account_name
-                )
-            )
+        req = self.request('pendinggifts', 'get', '{0}/my/inventory'.format(self.community_url))
 
-            return enums.WebAccountResult.Timeout
-        except Exception, e:
+        if type(req) is enums.WebAccountResult:
             log.error(
-                u'Unable to get user inventory for account {0}. Raised {1}'.format(
+                u'Unable to get user inventory for account {0}. Received {1}'.format(
                     self.account_name,
-                    e
+                    repr(req)
                 )
             )
 
-            return enums.WebAccount.UnknownException
+            return req
 
         if req.status_code != 200:
             log.error(
@@ -481,31 +644,24 @@ class WebAccount(object):
 
             return enums.WebAccountResult.Failed
 
-        inventory_matches = items.SteamGiftInventory.all_from(req.text)
-
-        if not len(inventory_matches):
-            log.info(u'Crawler was unable to find any pending gifts')
-
-            return enums.WebAccountResult.Failed
-
-        inventory = inventory_matches[0]
+        with metrics.timer('step_seconds', account=self.account_name, step='pending_gifts_parse'):
+            pending_gifts = pending.parse_pending_gifts(req.text)
 
-        if not len(inventory.gifts):
+        if not pending_gifts:
             log.info(u'Crawler was unable to find any pending gifts')
 
             return enums.WebAccountResult.Failed
 
-        return inventory.gifts
+        return pending_gifts
 
     def delivery_is_overdue(self, relation_type, relation_id):
-        delivery_config = delivery.Delivery().get_delivery_config()
+        delivery_config = self.context.get_delivery_config()
+        relation = self.context.get_relation(relation_type, relation_id)
 
         if relation_type == 'A':
-            relation = userrequest.UserRequest()._get_relation_id(relation_id)
             time_diff = datetime.datetime.now() - (relation.request.paid_date or datetime.datetime.now())
 
         elif relation_type == 'C':
-            relation = paidrequest.PaidRequest()._get_relation_id(relation_id)
             time_diff = datetime.datetime.now() - (relation.request.date or datetime.datetime.now())
 
         is_timely_overdue = (time_diff.total_seconds() / 60 / 60) > delivery_config.overdue_hour_courtesy
@@ -514,44 +670,50 @@ class WebAccount(object):
 
     def get_delivery_message(self, relation_type, relation_id):
         is_overdue = self.delivery_is_overdue(relation_type, relation_id)
-        delivery_message = delivery.Delivery().get_random_message(is_overdue=is_overdue)
+        message_template = self.context.get_message_template(is_overdue)
 
-        if relation_type == 'A':
-            relation = userrequest.UserRequest()._get_relation_id(relation_id)
-        elif relation_type == 'C':
-            relation = paidrequest.PaidRequest()._get_relation_id(relation_id)
+        relation = self.context.get_relation(relation_type, relation_id)
 
         user = relation.request.user
         request_custom_id = '{0}-{1}'.format(relation_type, relation.request.id)
 
-        if is_overdue and delivery_message.is_overdue:
-            overdue_code = delivery.Delivery().generate_overdue_code(relation_type, relation_id)
+        if is_overdue and message_template.is_overdue:
+            overdue_code = metrics.api(delivery.Delivery(), self.account_name).generate_overdue_code(
+                relation_type,
+                relation_id
+            )
 
-            delivery_message.giftee_name = delivery_message.giftee_name.format(user.name)
-            delivery_message.gift_message = delivery_message.gift_message.format(
+            gift_message = message_template.gift_message.format(
                 user.name,
                 overdue_code,
                 request_custom_id
             )
         else:
-            delivery_message.giftee_name = delivery_message.giftee_name.format(user.name)
-            delivery_message.gift_message = delivery_message.gift_message.format(user.name, request_custom_id)
+            gift_message = message_template.gift_message.format(user.name, request_custom_id)
 
-        return delivery_message
+        return context.DeliveryMessage(
+            giftee_name=message_template.giftee_name.format(user.name),
+            gift_message=gift_message,
+            gift_signature=message_template.gift_signature,
+            gift_sentiment=message_template.gift_sentiment
+        )
 
+    @metrics.timed('step_seconds', step='send_gift')
     def send_gift(self, assetid, email, relation_type, relation_id):
-        REFERER = 'https://store.steampowered.com/checkout/sendgift/{0}'.format(assetid)
+        from steam.enums import EResult
+
+        REFERER = '{0}/checkout/sendgift/{1}'.format(self.store_url, assetid)
         USER_AGENT = 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:44.0) Gecko/20100101 Firefox/44.0'
 
         delivery_message = self.get_delivery_message(relation_type, relation_id)
 
-        req = self.session.post(
-            'https://store.steampowered.com/checkout/sendgiftsubmit/',
+        req = self.request(
+            'sendgiftsubmit',
+            'post',
+            '{0}/checkout/sendgiftsubmit/'.format(self.store_url),
+            sessionid_field='SessionID',
+            sessionid_domain='store.steampowered.com',
             data={
-                'SessionID': self.session.cookies.get(
-                    'sessionid',
-                    domain='store.steampowered.com'
-                ),
                 'GiftGID': assetid,
                 'GiftMessage': delivery_message.gift_message,
                 'GiftSignature': delivery_message.gift_signature,
@@ -567,33 +729,38 @@ class WebAccount(object):
             }
         )
 
+        # Only an EResult is Steam's answer. Anything else comes back as a WebAccountResult, the gift
+        # may or may not have been sent
+
+        if type(req) is enums.WebAccountResult:
+            log.error(u'Gift submit for assetid {0} failed, received {1}'.format(assetid, repr(req)))
+
+            return req
+
         if req.status_code != 200:
             log.info(u'Gift submit received status code {1}'.format(assetid, req.status_code))
 
-            return EResult.Fail
+            return enums.WebAccountResult.Failed
 
         try:
             data = req.json()
         except ValueError:
             log.error(u'Could not serialize response, received {}'.format(req.text))
 
-            return EResult.Fail
+            return enums.WebAccountResult.ResponseNotSerializable
 
         result = EResult(data.get('success'))
 
+        metrics.increment('gifts_sent_total', account=self.account_name, result=result.name)
+
         if result == EResult.OK:
             sender_steam_id = self.get_steam_id_from_cookies()
 
-            tracking_id = asset_api.AssetTracking().get_or_create(
-                assetid,
+            self.tracking.record(
+                assetid=assetid,
+                state=EAssetHistoryState.Sent,
                 relation_type=relation_type,
-                relation_id=relation_id
-            )
-
-            asset_api.AssetTracking().create_history(tracking_id, EAssetHistoryState.Sent)
-
-            asset_api.AssetTracking().update_tracking(
-                id=tracking_id,
+                relation_id=relation_id,
                 sent_to_email=email,
                 sent_from_steam_id=sender_steam_id
             )
@@ -604,11 +771,74 @@ class WebAccount(object):
 class DeliveryBot(object):
     def __init__(self, owner_id, account_name, password, shared_secret, use_2fa=True):
         self.web_account = WebAccount(account_name, password, shared_secret, use_2fa=use_2fa)
+        self.account_name = account_name
         self.owner_id = owner_id
 
+        self.touched_requests_cache_key = 'delivery/touched_requests/{0}'.format(account_name)
+        self.tracked_inventory_cache_key = 'delivery/tracked_inventory/{0}'.format(account_name)
+        self.journal = journal.SendJournal(account_name)
+        self.stock_index = stock.StockIndex(owner_id, account_name)
+
+        self.begin_run()
+
+    def begin_run(self):
+        # Drops everything loaded by a previous run: backend data, the inventory snapshot and the
+        # send journal, which another node may have written to while it held the account
+
+        self.context = context.RunContext(account_name=self.account_name)
+        self.web_account.context = self.context
+        self.inventory = None
+        self.pending_relation_keys = []
+        self.journal.reload()
+
+    def get_inventory(self):
+        # The inventory is fetched once and shared by every phase until something changes it
+
+        if self.inventory is None:
+            snapshot = self.web_account.get_inventory_items()
+
+            if type(snapshot) is enums.WebAccountResult:
+                return snapshot
+
+            self.inventory = snapshot
+
+        return self.inventory
+
+    def publish_stock(self, snapshot, relation_keys):
+        # Journaled assets are on their way out even if the snapshot still lists them. Published once
+        # the journal was replayed, so assets of planned sends that did not go out are listed again
+
+        index = self.stock_index.publish(
+            snapshot.unsent_items,
+            self.journal.get_journaled_assetids(),
+            relation_keys
+        )
+
+        log.info(
+            u'Published stock index version {0} with {1} subs for {2}'.format(
+                index['version'],
+                len(index['items']),
+                self.account_name
+            )
+        )
+
+    def has_matching_stock(self, index, relations):
+        # Index keys are strings, sub ids are compared the way the allocator does
+
+        for relation in relations:
+            product_sub_id = allocation.get_product_sub_id(relation.product)
+
+            if product_sub_id is not None and str(product_sub_id) in index['items']:
+                return True
+
+        return False
+
+    def invalidate_inventory(self):
+        self.inventory = None
+
     def get_pending_deliveries(self):
-        paidrequest_relations = paidrequest.PaidRequest().get_pending_relations(self.owner_id)
-        userrequest_relations = userrequest.UserRequest().get_pending_relations(self.owner_id)
+        paidrequest_relations = self.paidrequest_api().get_pending_relations(self.owner_id)
+        userrequest_relations = self.userrequest_api().get_pending_relations(self.owner_id)
 
         log.info(
             u'Pending paidrequest relations: {}'.format(
@@ -622,85 +852,58 @@ class DeliveryBot(object):
             )
         )
 
-        unsent_items = self.web_account.get_inventory_items(filter_sent=True)
-
-        if type(unsent_items) is enums.WebAccountResult:
-            log.error(u'Unable to retrieve unsent items')
-
-            return []
-
-        unsent_items_count = sum([len(unsent_items[x]) for x in unsent_items.keys()])
+        relation_keys = [
+            stock.get_relation_key(relation_type, relation.id)
+            for relation_type, relations in (('C', paidrequest_relations), ('A', userrequest_relations))
+            for relation in relations
+        ]
 
-        log.info(u'Found {} unsent gifts'.format(unsent_items_count))
+        # A recent stock index without any of the pending subs spares fetching the inventory. It is only
+        # trusted when every pending relation was already pending when it was published
 
-        commited_assetids = []
-        pending_assets_delivery = []
+        index = self.stock_index.read_recent() if self.inventory is None else None
 
-        for relation in paidrequest_relations:
-            product = relation.product
+        if index is not None and self.stock_index.covers(index, relation_keys) and not (
+            self.has_matching_stock(index, paidrequest_relations) or
+            self.has_matching_stock(index, userrequest_relations)
+        ):
+            log.info(u'Stock index version {} has none of the pending subs, skipping'.format(index['version']))
 
-            if product.app_id and product.store_sub_id:
-                product_sub_id = product.store_sub_id
-            elif product.sub_id:
-                product_sub_id = product.sub_id
-            else:
-                log.error(u'Product id {} does not contain a store_sub_id'.format(product.id))
-
-                continue
+            return []
 
-            if not unsent_items.get(product_sub_id):
-                continue
+        snapshot = self.get_inventory()
 
-            for item in unsent_items[product_sub_id]:
-                if item.get('assetid') in commited_assetids:
-                    continue
+        if type(snapshot) is enums.WebAccountResult:
+            log.error(u'Unable to retrieve unsent items')
 
-                commited_assetids.append(item.get('assetid'))
+            return []
 
-                pending_assets_delivery.append({
-                    'relation_type': 'C',
-                    'name': item.get('name'),
-                    'relation_id': relation.id,
-                    'assetid': item.get('assetid'),
-                    'email': relation.request.user.email,
-                    'request_id': relation.request.id
-                })
+        log.info(u'Found {} unsent gifts'.format(snapshot.unsent_count()))
 
-                break
+        self.pending_relation_keys = relation_keys
+        self.publish_stock(snapshot, relation_keys)
 
-        for relation in userrequest_relations:
-            product = relation.product
+        # Assets with a journaled send are left alone even if the snapshot still lists them as unsent
 
-            if product.app_id and product.store_sub_id:
-                product_sub_id = product.store_sub_id
-            elif product.sub_id:
-                product_sub_id = product.sub_id
-            else:
-                log.error(u'Product id {} does not contain a sub_id'.format(product.id))
+        allocator = allocation.StockAllocator(snapshot.unsent_items, self.journal.get_journaled_assetids())
 
-                continue
+        pending_assets_delivery = (
+            allocator.allocate('C', paidrequest_relations) +
+            allocator.allocate('A', userrequest_relations)
+        )
 
-            if not unsent_items.get(product_sub_id):
-                continue
+        # The relations are already loaded, later lookups during the send are served from the run context
 
-            for item in unsent_items[product_sub_id]:
-                if item.get('assetid') in commited_assetids:
-                    continue
+        for pending_asset in pending_assets_delivery:
+            self.context.remember_relation(pending_asset.get('relation_type'), pending_asset.get('relation'))
 
-                commited_assetids.append(item.get('assetid'))
+        return pending_assets_delivery
 
-                pending_assets_delivery.append({
-                    'relation_type': 'A',
-                    'name': item.get('name'),
-                    'relation_id': relation.id,
-                    'assetid': item.get('assetid'),
-                    'email': relation.request.user.email,
-                    'request_id': relation.request.id
-                })
+    def userrequest_api(self):
+        return metrics.api(userrequest.UserRequest(), self.account_name)
 
-                break
-
-        return pending_assets_delivery
+    def paidrequest_api(self):
+        return metrics.api(paidrequest.PaidRequest(), self.account_name)
 
     def get_special_email(self, relation_type, relation_id, request_id):
         return 'entregas+{0}{1}{2}@extremegaming-arg.com.ar'.format(
@@ -709,103 +912,240 @@ class DeliveryBot(object):
             request_id
         )
 
+    @flushes_tracking
     def send_gifts(self, only_use_special_emails=False):
         if not self.web_account:
             return None
 
+        touched_requests = self.get_touched_requests()
+
+        self.replay_journal(touched_requests)
+
         pending_gifts = self.get_pending_deliveries()
+        snapshot = self.inventory
 
-        for gift in pending_gifts:
-            name = gift.get('name')
-            assetid = gift.get('assetid')
-            request_id = gift.get('request_id')
-            relation_id = gift.get('relation_id')
-            relation_type = gift.get('relation_type')
+        # Pipelined, the backend writes run on a background writer so the next gift goes out right away
 
-            if only_use_special_emails:
-                email = self.get_special_email(relation_type, relation_id, request_id)
-            else:
-                email = gift.get('email')
+        bookkeeping = None
 
-            log.info(
-                u'Sending gift {0} assetid {1} to {2} for request {3}-{4} relation {5}'.format(
-                    name,
+        if getattr(config, 'PIPELINED_BOOKKEEPING', PIPELINED_BOOKKEEPING):
+            bookkeeping = writer.BookkeepingWriter(self.record_sent_gift)
+
+        # Sends run concurrently, their results are handled in the pending deliveries order. A gift Steam refused
+        # is sent again to the special email once the first send of every gift was handed out, one whose outcome
+        # is unknown is not.
+
+        try:
+            with dispatch.AsyncWebAccount(self.web_account) as async_account:
+                sends = [
+                    (gift, self.submit_gift(async_account, gift, only_use_special_emails))
+                    for gift in pending_gifts
+                ]
+
+                retries = []
+
+                for gift, task in sends:
+                    result = task.result()
+
+                    if self.is_refused(result) and not only_use_special_emails:
+                        log.info(u'Sending failed, received {}'.format(repr(result)))
+
+                        retries.append((gift, self.submit_gift(async_account, gift, True)))
+
+                        continue
+
+                    self.handle_sent_gift(gift, result, touched_requests, bookkeeping)
+
+                for gift, task in retries:
+                    self.handle_sent_gift(gift, task.result(), touched_requests, bookkeeping)
+        finally:
+            # Every queued write is applied before the requests are checked for completion
+
+            if bookkeeping:
+                bookkeeping.close()
+
+        if bookkeeping:
+            bookkeeping.raise_failure()
+
+        # The sent gifts are journaled until the compaction, publishing now leaves them out of the index
+
+        if snapshot is not None and pending_gifts:
+            self.publish_stock(snapshot, self.pending_relation_keys)
+
+        self.journal.compact()
+        self.complete_requests(touched_requests)
+
+    def is_refused(self, result):
+        # Steam answered the send and did not deliver the gift, a WebAccountResult is no answer
+
+        if type(result) is enums.WebAccountResult:
+            return False
+
+        from steam.enums import EResult
+
+        return EResult(result) != EResult.OK
+
+    def submit_gift(self, async_account, gift, use_special_email):
+        name = gift.get('name')
+        assetid = gift.get('assetid')
+        request_id = gift.get('request_id')
+        relation_id = gift.get('relation_id')
+        relation_type = gift.get('relation_type')
+
+        if use_special_email:
+            email = self.get_special_email(relation_type, relation_id, request_id)
+        else:
+            email = gift.get('email')
+
+        log.info(
+            u'Sending gift {0} assetid {1} to {2} for request {3}-{4} relation {5}'.format(
+                name,
+                assetid,
+                email,
+                relation_type,
+                request_id,
+                relation_id
+            )
+        )
+
+        self.journal.record(journal.Planned, assetid, relation_type, request_id, relation_id)
+
+        return async_account.send_gift(assetid, email, relation_type, relation_id)
+
+    def handle_sent_gift(self, gift, result, touched_requests, bookkeeping):
+        name = gift.get('name')
+        assetid = gift.get('assetid')
+        request_id = gift.get('request_id')
+        relation_id = gift.get('relation_id')
+        relation_type = gift.get('relation_type')
+
+        # Without an answer from Steam the send stays planned, the next run asks the inventory whether it went out
+
+        if type(result) is enums.WebAccountResult:
+            log.error(
+                u'Outcome of sending assetid {0} is unknown, received {1}. Leaving it to the next run'.format(
                     assetid,
-                    email,
-                    relation_type,
-                    request_id,
-                    relation_id
+                    repr(result)
                 )
             )
 
-            result = self.web_account.send_gift(assetid, email, relation_type, relation_id)
+            return
+
+        if self.is_refused(result):
+            log.info(u'Sending failed, received {}'.format(repr(result)))
+
+            self.journal.record(journal.Failed, assetid, relation_type, request_id, relation_id)
+
+            return
+
+        log.info(u'Sent gift {} succesfuly'.format(name))
+
+        self.journal.record(journal.Submitted, assetid, relation_type, request_id, relation_id)
+
+        self.invalidate_inventory()
+        self.touch_request(touched_requests, relation_type, request_id, relation_id)
+
+        if bookkeeping:
+            bookkeeping.put(relation_type, request_id, relation_id, assetid)
+        else:
+            self.record_sent_gift(relation_type, request_id, relation_id, assetid)
+
+    def replay_journal(self, touched_requests):
+        # Finishes the sends a previous run left behind. Submitted ones only miss their backend writes.
+        # For planned ones it is not known whether Steam got them, the inventory tells: a gift that is
+        # still unsent, whether its sub was resolved or not, was not delivered and can be planned again.
+
+        planned = self.journal.get_entries(journal.Planned)
+
+        snapshot = self.get_inventory() if planned else None
+
+        if type(snapshot) is enums.WebAccountResult:
+            log.error(u'Unable to resolve {} planned sends without the inventory'.format(len(planned)))
+        elif snapshot:
+            for entry in planned:
+                state = journal.Failed if entry.assetid in snapshot.unsent_assetids else journal.Submitted
+
+                self.journal.record(state, entry.assetid, entry.relation_type, entry.request_id, entry.relation_id)
+
+        submitted = self.journal.get_entries(journal.Submitted)
 
-            if EResult(result) != EResult.OK and not only_use_special_emails:
-                log.info(u'Sending failed, received {}'.format(repr(EResult(result))))
+        if submitted:
+            log.info(u'Replaying {} journaled sends'.format(len(submitted)))
 
-                email = self.get_special_email(relation_type, relation_id, request_id)
+        for entry in submitted:
+            self.touch_request(touched_requests, entry.relation_type, entry.request_id, entry.relation_id)
+            self.record_sent_gift(entry.relation_type, entry.request_id, entry.relation_id, entry.assetid)
 
+    def record_sent_gift(self, relation_type, request_id, relation_id, assetid):
+        relation = self.context.get_relation(relation_type, relation_id)
+        is_assigned = self.context.get_assigned_id(relation_type, relation.request) is not None
+
+        if relation_type == 'A':
+            self.userrequest_api().set_sent(relation_id, gid=assetid)
+
+            if not is_assigned:
                 log.info(
-                    u'Sending gift {0} assetid {1} to {2} for request {3}-{4} relation {5}'.format(
-                        name,
-                        assetid,
-                        email,
-                        relation_type,
-                        request_id,
-                        relation_id
-                    )
+                    u'Assigning user id {0} to request {1}-{2}'.format(self.owner_id, relation_type, request_id)
                 )
 
-                result = self.web_account.send_gift(assetid, email, relation_type, relation_id)
+                self.userrequest_api().assign(request_id, self.owner_id)
 
-            if EResult(result) != EResult.OK:
-                log.info(u'Sending failed, received {}'.format(repr(EResult(result))))
+        elif relation_type == 'C':
+            self.paidrequest_api().set_sent(relation_id, gid=assetid)
 
-                continue
+            if not is_assigned:
+                log.info(
+                    u'Assigning user id {0} to request {1}-{2}'.format(self.owner_id, relation_type, request_id)
+                )
 
-            log.info(u'Sent gift {} succesfuly'.format(name))
+                self.paidrequest_api().assign(request_id, self.owner_id)
 
-            if relation_type == 'A':
-                relation = userrequest.UserRequest()._get_relation_id(relation_id)
-                userrequest.UserRequest().set_sent(relation_id, gid=assetid)
+        if not is_assigned:
+            self.context.set_assigned(relation_type, request_id, self.owner_id)
 
-                if not relation.request.assigned:
-                    log.info(
-                        u'Assigning user id {0} to request {1}-{2}'.format(self.owner_id, relation_type, request_id)
-                    )
+        self.journal.record(journal.Confirmed, assetid, relation_type, request_id, relation_id)
 
-                    userrequest.UserRequest().assign(request_id, self.owner_id)
+    def get_touched_requests(self):
+        # Requests that received a gift and may need accepting. They are kept in the cache until
+        # the completion sweep ran, so a run that died half way is completed by the next one
 
-            elif relation_type == 'C':
-                relation = paidrequest.PaidRequest()._get_relation_id(relation_id)
-                paidrequest.PaidRequest().set_sent(relation_id, gid=assetid)
+        cached = cache.get(self.touched_requests_cache_key)
 
-                if not relation.request.assigned:
-                    log.info(
-                        u'Assigning user id {0} to request {1}-{2}'.format(self.owner_id, relation_type, request_id)
-                    )
+        return json.loads(cached) if cached else {}
 
-                    paidrequest.PaidRequest().assign(request_id, self.owner_id)
+    def touch_request(self, touched_requests, relation_type, request_id, relation_id):
+        request_key = u'{0}-{1}'.format(relation_type, request_id)
 
-        paidrequests = paidrequest.PaidRequest().get_paid_query()
-        userrequests = userrequest.UserRequest().get_paid_query()
+        if request_key in touched_requests:
+            return
 
-        for paidrequest_data in paidrequests:
-            if (
-                paidrequest_data.products.filter(sent=False).count() == 0 and
-                paidrequest_data.assigned.id == self.owner_id
-            ):
-                log.info(u'Accepting request C-{}'.format(paidrequest_data.id))
-                paidrequest.PaidRequest().accept_paidrequest(paidrequest_data.id, self.owner_id)
+        touched_requests[request_key] = relation_id
+
+        cache.set(self.touched_requests_cache_key, json.dumps(touched_requests), timeout=TOUCHED_REQUESTS_TIMEOUT_SECONDS)
+
+    def complete_requests(self, touched_requests):
+        log.info(u'Checking {} requests for completion'.format(len(touched_requests)))
+
+        for request_key, relation_id in sorted(touched_requests.items()):
+            relation_type = request_key.split('-')[0]
+            request = self.context.get_relation(relation_type, relation_id).request
 
-        for userrequest_data in userrequests:
             if (
-                userrequest_data.products.filter(sent=False).count() == 0 and
-                userrequest_data.assigned.id == self.owner_id
+                request.products.filter(sent=False).count() != 0 or
+                self.context.get_assigned_id(relation_type, request) != self.owner_id
             ):
-                log.info(u'Accepting request A-{}'.format(userrequest_data.id))
-                userrequest.UserRequest().accept_userrequest(userrequest_data.id, self.owner_id)
+                continue
+
+            log.info(u'Accepting request {}'.format(request_key))
 
+            if relation_type == 'A':
+                self.userrequest_api().accept_userrequest(request.id, self.owner_id)
+            elif relation_type == 'C':
+                self.paidrequest_api().accept_paidrequest(request.id, self.owner_id)
+
+        cache.delete(self.touched_requests_cache_key)
+
+    @flushes_tracking
     def accept_gifts(self):
         gifts = self.web_account.get_pending_gifts()
 
@@ -818,25 +1158,21 @@ class DeliveryBot(object):
 
         log.info(u'Found {0} pending gifts'.format(len(gifts)))
 
+        sender_gifts = []
+
         for gift in gifts:
             if not gift.gift_javascript:
                 log.error(u'Unable to find gift javascript object')
 
                 continue
 
-            matches = re.findall(
-                r'BuildHover\( .*, ({.*}), .*\)',
-                gift.gift_javascript,
-                re.DOTALL
-            )
+            gift_object = gift.gift_object
 
-            if not len(matches):
-                log.error(u'Regex failed to retrieve gift javascript object')
+            if not gift_object:
+                log.error(u'Unable to parse gift javascript object')
 
                 continue
 
-            gift_object = json.loads(matches[0])
-
             log.info(
                 u'Found pending gift {0} from {1} ({2})'.format(
                     gift_object.get('name'),
@@ -855,96 +1191,116 @@ class DeliveryBot(object):
 
                 continue
 
-            if match.group('type') == 'profiles':
-                sender_steam_id = match.group('value')
-            else:
-                api = WebAPI(backend_config.STEAM_API_KEY)
+            sender_gifts.append((gift, gift_object, match.group('type'), match.group('value').strip('/')))
 
-                api_result = api.call(
-                    'ISteamUser.ResolveVanityURL',
-                    vanityurl=match.group('value'),
-                    url_type=1,
-                    format='json'
-                )
+        # Vanity names are resolved once per call, repeat senders are answered from the cache
 
-                if (
-                    not api_result.get('response') or
-                    api_result.get('response').get('success') != 1
-                ):
-                    log.error(
-                        u'Unable to resolve sender steamid, ResolveVanityURL returned {}'.format(
-                            api_result
-                        )
-                    )
+        vanity_steam_ids = vanity.resolve_vanity_urls([
+            value for gift, gift_object, link_type, value in sender_gifts if link_type != 'profiles'
+        ])
 
-                    continue
+        # Accepts and declines run concurrently, their results are handled in the pending gifts order
+
+        with dispatch.AsyncWebAccount(self.web_account) as async_account:
+            handled_gifts = []
+
+            for gift, gift_object, link_type, value in sender_gifts:
+                if link_type == 'profiles':
+                    sender_steam_id = value
+                elif value in vanity_steam_ids:
+                    sender_steam_id = vanity_steam_ids[value]
                 else:
-                    sender_steam_id = api_result.get('response').get('steamid')
+                    log.error(u'Unable to resolve sender steamid for {}'.format(gift.from_link))
 
-            if not gift.accept_button or 'UnpackGift' in gift.accept_button:
-                log.info(u'Gift cannot be accepted to inventory')
+                    continue
 
-                log.info(
-                    u'Declining gift id {0} to sender id {1}'.format(
-                        gift_object.get('id'),
-                        sender_steam_id
-                    )
-                )
+                task = self.handle_pending_gift(async_account, gift, gift_object, sender_steam_id)
 
-                result = self.web_account.decline_gift(
+                if task is not None:
+                    handled_gifts.append((gift, gift_object, task))
+
+            for gift, gift_object, task in handled_gifts:
+                self.handle_pending_gift_result(gift, gift_object, task.result())
+
+    def handle_pending_gift(self, async_account, gift, gift_object, sender_steam_id):
+        # Returns the accept or decline task for the gift, None if it is left pending
+
+        if not gift.accept_button or 'UnpackGift' in gift.accept_button:
+            log.info(u'Gift cannot be accepted to inventory')
+
+            log.info(
+                u'Declining gift id {0} to sender id {1}'.format(
                     gift_object.get('id'),
                     sender_steam_id
                 )
+            )
 
-                if result != EResult.OK:
-                    log.error(
-                        u'Could not accept gift id {0}. Received {1}'.format(
-                            gift_object,
-                            repr(result)
-                        )
-                    )
+            return async_account.decline_gift(
+                gift_object.get('id'),
+                sender_steam_id
+            )
 
-            elif 'ShowAcceptGiftOptions' in gift.accept_button:
-                log.info(
-                    u'Accepting gift id {0} to gift inventory'.format(
-                        gift_object.get('id')
-                    )
+        elif 'ShowAcceptGiftOptions' in gift.accept_button:
+            log.info(
+                u'Accepting gift id {0} to gift inventory'.format(
+                    gift_object.get('id')
                 )
+            )
+
+            return async_account.accept_gift(
+                gift_object.get('id'),
+                sender_steam_id
+            )
+
+    def handle_pending_gift_result(self, gift, gift_object, result):
+        from steam.enums import EResult
+
+        # A WebAccountResult is no answer from Steam, compared as an int WebAccountResult.Timeout equals EResult.OK
 
-                result = self.web_account.accept_gift(
+        if type(result) is enums.WebAccountResult:
+            log.error(
+                u'Outcome of handling gift id {0} is unknown, received {1}'.format(
                     gift_object.get('id'),
-                    sender_steam_id
+                    repr(result)
+                )
+            )
+        elif result != EResult.OK:
+            log.error(
+                u'Could not accept gift id {0}. Received {1}'.format(
+                    gift_object,
+                    repr(result)
                 )
+            )
+        elif gift.accept_button and 'ShowAcceptGiftOptions' in gift.accept_button:
+            # The accepted gift is a new asset the current inventory snapshot and stock index do not know about
 
-                if result != EResult.OK:
-                    log.error(
-                        u'Could not accept gift id {0}. Received {1}'.format(
-                            gift_object,
-                            repr(result)
-                        )
-                    )
+            self.invalidate_inventory()
+            self.stock_index.clear()
 
+    @flushes_tracking
     def track_gifts(self):
-        sent_items = self.web_account.get_inventory_items(filter_sent=False)
+        snapshot = self.get_inventory()
 
-        if type(sent_items) is enums.WebAccountResult:
+        if type(snapshot) is enums.WebAccountResult:
             log.error(u'Unable to retrieve sent items')
 
             return
 
-        unsent_items_count = sum([len(sent_items[x]) for x in sent_items.keys()])
+        log.info(u'Found {} sent gifts'.format(snapshot.sent_count()))
 
-        log.info(u'Found {} sent gifts'.format(unsent_items_count))
+        # Every tracking missing from this same inventory was already marked by the last track
 
-        assetids = []
+        if snapshot.fingerprint and cache.get(self.tracked_inventory_cache_key) == snapshot.fingerprint:
+            log.info(u'Inventory is unchanged since the last track, skipping it')
 
-        for sub_id in sent_items.keys():
-            assets = sent_items[sub_id]
+            return
 
-            for asset in assets:
-                assetids.append(asset.get('assetid'))
+        assetids = snapshot.sent_assetids
 
-        uncompleted_trackings = asset_api.AssetTracking().get_uncompleted_trackings()
+        uncompleted_trackings = metrics.api(
+            asset_api.AssetTracking(),
+            self.account_name
+        ).get_uncompleted_trackings()
         current_steam_id = self.web_account.get_steam_id_from_cookies()
 
         for tracking in uncompleted_trackings:
@@ -955,9 +1311,14 @@ class DeliveryBot(object):
                     )
                 )
 
-                asset_api.AssetTracking().create_history(
-                    tracking.id,
-                    EAssetHistoryState.MissingFromInventory
+                self.web_account.tracking.record(
+                    tracking_id=tracking.id,
+                    state=EAssetHistoryState.MissingFromInventory,
+                    completed=True
                 )
 
-                asset_api.AssetTracking().update_tracking(id=tracking.id, completed=True)
+        # Kept only once the trackings are written, a failed write makes the next track run in full
+
+        self.web_account.tracking.flush()
+
+        cache.set(self.tracked_inventory_cache_key, snapshot.fingerprint, timeout=INVENTORY_CACHE_TIMEOUT_SECONDS)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import os
+import time
+import socket
+import config
+import hashlib
+import logging
+import threading
+
+from steamcommerce_api.cache import cache
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+NODE_HEARTBEAT_SECONDS = 30
+NODE_TIMEOUT_SECONDS = 90
+
+
+class ClusterCoordinator(object):
+    # Splits accounts between the worker nodes that are alive. Every node heartbeats into the shared
+    # cache and assigns accounts with rendezvous hashing over the live nodes, so all nodes agree on
+    # the owners and only the accounts of a node that joins or dies move. Account leases still
+    # guard against two nodes driving one account while a rebalance settles.
+
+    def __init__(self, node_id=None):
+        self.node_id = node_id or getattr(config, 'NODE_ID', None) or '{0}-{1}'.format(
+            socket.gethostname(),
+            os.getpid()
+        )
+
+        self.node_timeout = getattr(config, 'NODE_TIMEOUT_SECONDS', NODE_TIMEOUT_SECONDS)
+        self.nodes_cache_key = 'delivery/cluster/nodes'
+        self.nodes = [self.node_id]
+        self.lock = threading.Lock()
+
+    def get_node_cache_key(self, node_id):
+        return 'delivery/cluster/node/{0}'.format(node_id)
+
+    def heartbeat(self):
+        cache.set(self.get_node_cache_key(self.node_id), time.time(), timeout=self.node_timeout)
+
+        # Membership is read and written back without a compare-and-set, a node dropped by a
+        # concurrent write adds itself again on its next heartbeat
+
+        node_ids = cache.get(self.nodes_cache_key) or []
+
+        if self.node_id not in node_ids:
+            cache.set(self.nodes_cache_key, node_ids + [self.node_id])
+
+    def get_live_nodes(self):
+        node_ids = cache.get(self.nodes_cache_key) or []
+
+        if not node_ids:
+            return [self.node_id]
+
+        now = time.time()
+        beats = cache.get_many(*[self.get_node_cache_key(node_id) for node_id in node_ids])
+
+        live_nodes = [
+            node_id for node_id, beat in zip(node_ids, beats)
+            if beat and now - float(beat) < self.node_timeout
+        ]
+
+        if len(live_nodes) != len(node_ids):
+            log.info(
+                u'Removing nodes {} from the cluster'.format(
+                    ', '.join(sorted(set(node_ids) - set(live_nodes)))
+                )
+            )
+
+            cache.set(self.nodes_cache_key, live_nodes)
+
+        if self.node_id not in live_nodes:
+            live_nodes.append(self.node_id)
+
+        return sorted(live_nodes)
+
+    def refresh(self):
+        self.heartbeat()
+
+        nodes = self.get_live_nodes()
+
+        with self.lock:
+            if nodes != self.nodes:
+                log.info(u'Cluster nodes changed to {}'.format(', '.join(nodes)))
+
+            self.nodes = nodes
+
+    def get_owner(self, account_name):
+        with self.lock:
+            nodes = list(self.nodes)
+
+        return max(
+            nodes,
+            key=lambda node_id: hashlib.md5(u'{0}/{1}'.format(node_id, account_name).encode('utf-8')).hexdigest()
+        )
+
+    def is_assigned(self, account_name):
+        return self.get_owner(account_name) == self.node_id
+
+    def leave(self):
+        cache.delete(self.get_node_cache_key(self.node_id))
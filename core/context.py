@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import config
+import random
+import collections
+
+from core import metrics
+
+from steamcommerce_api.api import delivery
+from steamcommerce_api.api import userrequest
+from steamcommerce_api.api import paidrequest
+
+DeliveryMessage = collections.namedtuple(
+    'DeliveryMessage',
+    ['giftee_name', 'gift_message', 'gift_signature', 'gift_sentiment']
+)
+
+MESSAGE_TEMPLATE_POOL_SIZE = 10
+
+
+class RunContext(object):
+    # Backend data loaded once per run and shared by every phase: the delivery config,
+    # a pool of random message templates per overdue state and relations by (relation_type, relation_id)
+
+    def __init__(self, account_name=None):
+        self.account_name = account_name
+        self.delivery_config = None
+        self.messages = {}
+        self.relations = {}
+        self.assignments = {}
+
+    def get_delivery_config(self):
+        if self.delivery_config is None:
+            self.delivery_config = metrics.api(delivery.Delivery(), self.account_name).get_delivery_config()
+
+        return self.delivery_config
+
+    def get_message_template(self, is_overdue):
+        # The backend only hands out one random template at a time. The first gifts of a run draw a new one
+        # each, the following ones pick at random among those drawn, so gifts keep getting varied messages.
+
+        templates = self.messages.setdefault(is_overdue, [])
+
+        if len(templates) < getattr(config, 'MESSAGE_TEMPLATE_POOL_SIZE', MESSAGE_TEMPLATE_POOL_SIZE):
+            template = metrics.api(delivery.Delivery(), self.account_name).get_random_message(is_overdue=is_overdue)
+            templates.append(template)
+
+            return template
+
+        return random.choice(templates)
+
+    def remember_relation(self, relation_type, relation):
+        self.relations[(relation_type, relation.id)] = relation
+
+    def get_relation(self, relation_type, relation_id):
+        key = (relation_type, relation_id)
+
+        if key not in self.relations:
+            if relation_type == 'A':
+                self.relations[key] = metrics.api(userrequest.UserRequest(), self.account_name)._get_relation_id(relation_id)
+            elif relation_type == 'C':
+                self.relations[key] = metrics.api(paidrequest.PaidRequest(), self.account_name)._get_relation_id(relation_id)
+
+        return self.relations[key]
+
+    def set_assigned(self, relation_type, request_id, owner_id):
+        # Remembered relations keep the request as it was loaded, so assignments made
+        # during the run are tracked here
+
+        self.assignments[(relation_type, request_id)] = owner_id
+
+    def get_assigned_id(self, relation_type, request):
+        if (relation_type, request.id) in self.assignments:
+            return self.assignments[(relation_type, request.id)]
+
+        return request.assigned.id if request.assigned else None
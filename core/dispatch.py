@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import config
+
+from core import pool
+
+ACCOUNT_MAX_IN_FLIGHT = 4
+
+
+class AsyncWebAccount(object):
+    # The WebAccount calls a phase fans out, each one returning a pool.Task whose result is what the
+    # WebAccount method returns. At most max_in_flight calls of the account run at once, the rest wait
+    # in order. Leaving the with block after an error cancels the calls that did not start yet.
+
+    def __init__(self, web_account, max_in_flight=None):
+        self.web_account = web_account
+        self.pool = pool.WorkerPool(
+            max_in_flight or getattr(config, 'ACCOUNT_MAX_IN_FLIGHT', ACCOUNT_MAX_IN_FLIGHT)
+        )
+
+    def get_steam_inventory(self, *args, **kwargs):
+        return self.pool.submit(self.web_account.get_steam_inventory, *args, **kwargs)
+
+    def get_pending_gifts(self):
+        return self.pool.submit(self.web_account.get_pending_gifts)
+
+    def accept_gift(self, gift_id, sender_steam_id):
+        return self.pool.submit(self.web_account.accept_gift, gift_id, sender_steam_id)
+
+    def decline_gift(self, gift_id, sender_steam_id, **kwargs):
+        return self.pool.submit(self.web_account.decline_gift, gift_id, sender_steam_id, **kwargs)
+
+    def send_gift(self, assetid, email, relation_type, relation_id):
+        return self.pool.submit(self.web_account.send_gift, assetid, email, relation_type, relation_id)
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.pool.cancel()
+
+        self.close()
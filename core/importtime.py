@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import os
+import sys
+import time
+import logging
+import __builtin__
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+IMPORT_TIME_ENV = 'DELIVERY_IMPORT_TIME'
+IMPORT_TIME_REPORT_SIZE = 25
+
+
+class ImportTimer(object):
+    # Wraps __import__ and keeps, for every module loaded while installed, the milliseconds its import took
+    # with (cumulative) and without (self) the modules it imported in turn. Imports are serialized by the
+    # interpreter's import lock, so one stack is enough.
+    #
+    # A call is timed by the modules it added to sys.modules, the name passed to __import__ is only the
+    # package of a from import. Modules a call loaded without a nested call, such as the parents of a
+    # dotted name or several entries of one from import, share its timing.
+
+    def __init__(self):
+        self.timings = []
+        self.stack = []
+        self.original_import = None
+
+    def install(self):
+        self.original_import = __builtin__.__import__
+        __builtin__.__import__ = self.timed_import
+
+        return self
+
+    def uninstall(self):
+        if self.original_import is not None:
+            __builtin__.__import__ = self.original_import
+            self.original_import = None
+
+    def timed_import(self, *args, **kwargs):
+        # Every stack entry holds the time and the modules of the nested calls that loaded something
+
+        loaded_before = set(sys.modules)
+
+        self.stack.append([0.0, set()])
+        started = time.time()
+
+        try:
+            return self.original_import(*args, **kwargs)
+        finally:
+            elapsed = time.time() - started
+            nested, nested_modules = self.stack.pop()
+
+            # Python 2 leaves None entries behind for the relative imports it tried first
+
+            loaded = set(
+                name for name, module in sys.modules.items()
+                if module is not None and name not in loaded_before
+            )
+
+            if loaded:
+                if self.stack:
+                    self.stack[-1][0] += elapsed
+                    self.stack[-1][1].update(loaded)
+
+                if loaded - nested_modules:
+                    self.timings.append((
+                        sorted(loaded - nested_modules),
+                        elapsed * 1000,
+                        (elapsed - nested) * 1000
+                    ))
+
+    def report(self, limit=IMPORT_TIME_REPORT_SIZE):
+        total = sum(self_ms for names, cumulative_ms, self_ms in self.timings)
+        count = sum(len(names) for names, cumulative_ms, self_ms in self.timings)
+
+        log.info(u'Imported {0} modules in {1:.1f} ms'.format(count, total))
+
+        for names, cumulative_ms, self_ms in sorted(self.timings, key=lambda timing: -timing[1])[:limit]:
+            log.info(u'{0:>10.1f} ms {1:>10.1f} ms self  {2}'.format(cumulative_ms, self_ms, ', '.join(names)))
+
+
+timer = None
+
+
+def start():
+    # Does nothing unless DELIVERY_IMPORT_TIME is set, must run before the imports to measure
+
+    global timer
+
+    if os.environ.get(IMPORT_TIME_ENV) and timer is None:
+        timer = ImportTimer().install()
+
+
+def report():
+    if timer is not None:
+        timer.report()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import re
+import hashlib
+import logging
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+STORE_LINK = re.compile(r'http://store.steampowered.com/(.*?)/([0-9]+)/', re.DOTALL)
+
+
+def item_description_is_sent(owner_descriptions):
+    description_values = [x.get('value') for x in owner_descriptions or []]
+
+    return 'Sent to' in ''.join(description_values)
+
+
+def get_item_info_from_actions(actions):
+    item_info = {}
+
+    for action in actions or []:
+        action_name = action.get('name')
+        action_link = action.get('link')
+
+        if action_name != 'View in store':
+            continue
+
+        item_matches = STORE_LINK.findall(action_link)
+
+        if not len(item_matches):
+            log.error(u'Could not match item information from link {}'.format(action_link))
+
+            break
+
+        item_match = item_matches[0]
+
+        item_info['type'] = item_match[0]
+        item_info['id'] = item_match[1]
+
+    return item_info
+
+
+class ItemDescription(object):
+    # The fields of an inventory description the bot reads. The item info is parsed from
+    # the store link once per description instead of once per asset.
+
+    __slots__ = ('name', 'actions', 'is_sent', 'item_info')
+
+    def __init__(self, name, actions, is_sent):
+        self.name = name
+        self.actions = actions
+        self.is_sent = is_sent
+        self.item_info = None
+
+    def get_item_info(self):
+        if self.item_info is None:
+            self.item_info = get_item_info_from_actions(self.actions)
+
+        return self.item_info
+
+
+class InventoryItem(object):
+    __slots__ = ('name', 'assetid')
+
+    def __init__(self, name, assetid):
+        self.name = name
+        self.assetid = assetid
+
+
+def parse_descriptions(descriptions, known_descriptions=None):
+    # Returns a (classid, instanceid) -> ItemDescription dictionary. A classid and instanceid pair always
+    # names the same description, so the ones parsed from earlier pages in known_descriptions are reused
+
+    known_descriptions = {} if known_descriptions is None else known_descriptions
+
+    for description in descriptions:
+        key = (description.get('classid'), description.get('instanceid'))
+
+        if key not in known_descriptions:
+            known_descriptions[key] = ItemDescription(
+                description.get('name'),
+                description.get('actions'),
+                item_description_is_sent(description.get('owner_descriptions'))
+            )
+
+    return known_descriptions
+
+
+def iter_page_items(inventory_data, known_descriptions=None, fingerprint=None):
+    # Yields (assetid, ItemDescription) for every asset of an inventory page that has a description.
+    # Every asset of the page is added to the fingerprint, if one is given
+
+    descriptions = parse_descriptions(inventory_data.get('descriptions'), known_descriptions)
+
+    for asset in inventory_data.get('assets') or []:
+        description = descriptions.get((asset.get('classid'), asset.get('instanceid')))
+
+        if fingerprint is not None:
+            fingerprint.add(
+                asset.get('assetid'),
+                asset.get('classid'),
+                asset.get('instanceid'),
+                description.is_sent if description is not None else None
+            )
+
+        if description is not None:
+            yield asset.get('assetid'), description
+
+
+class InventoryFingerprint(object):
+    # A digest of the assets of an inventory that does not depend on the order they were listed in.
+    # Every asset adds the first 64 bits of its md5 to a running sum, so pages can be added one by one.
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, assetid, classid, instanceid, is_sent):
+        digest = hashlib.md5('{0}_{1}_{2}_{3}'.format(assetid, classid, instanceid, int(bool(is_sent)))).hexdigest()
+
+        self.total = (self.total + int(digest[:16], 16)) % 2 ** 64
+        self.count += 1
+
+    def hexdigest(self):
+        return '{0:016x}-{1}'.format(self.total, self.count)
+
+
+def dump_unsent_items(unsent_items):
+    return dict((sub_id, [[item.name, item.assetid] for item in items]) for sub_id, items in unsent_items.items())
+
+
+def load_unsent_items(data):
+    return dict((sub_id, [InventoryItem(name, assetid) for name, assetid in items]) for sub_id, items in data.items())
+
+
+class InventorySnapshot(object):
+    # One gift inventory fetch, split into the unsent items (grouped by sub_id)
+    # and the assetids of gifts that were already sent. unsent_assetids holds every
+    # unsent gift, also those whose sub could not be resolved.
+
+    def __init__(self):
+        self.unsent_items = {}
+        self.unsent_assetids = set()
+        self.sent_assetids = set()
+        self.fingerprint = None
+
+    def add_unsent_asset(self, assetid):
+        self.unsent_assetids.add(assetid)
+
+    def add_unsent(self, sub_id, name, assetid):
+        self.unsent_items.setdefault(str(sub_id), []).append(InventoryItem(name, assetid))
+
+    def add_sent(self, assetid):
+        self.sent_assetids.add(assetid)
+
+    def unsent_count(self):
+        return sum([len(self.unsent_items[x]) for x in self.unsent_items.keys()])
+
+    def sent_count(self):
+        return len(self.sent_assetids)
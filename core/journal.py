@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import os
+import config
+import logging
+import threading
+import collections
+
+from steamcommerce_api.cache import cache
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+SEND_JOURNAL_DIR = os.path.join('data', 'journal')
+SEND_JOURNAL_CACHE_TIMEOUT_SECONDS = 7 * 24 * 60 * 60
+
+# One line per state change, tab separated: state, assetid, relation_type, request_id, relation_id
+
+Planned = 'P'  # about to be submitted to Steam, or submitted without getting an answer
+Submitted = 'S'  # Steam accepted the gift, the backend does not know yet
+Confirmed = 'C'  # set_sent and assign were written
+Failed = 'F'  # Steam refused the gift, the asset can be planned again
+
+JournalEntry = collections.namedtuple(
+    'JournalEntry',
+    ['state', 'assetid', 'relation_type', 'request_id', 'relation_id']
+)
+
+
+def format_line(entry):
+    return '\t'.join(str(field) for field in entry) + '\n'
+
+
+def parse_line(line):
+    # Returns None for a line cut short by a crash, it has no newline
+
+    fields = line.rstrip('\n').split('\t')
+
+    if not line.endswith('\n') or len(fields) != len(JournalEntry._fields):
+        log.error(u'Ignoring incomplete journal line {}'.format(repr(line)))
+
+        return None
+
+    state, assetid, relation_type, request_id, relation_id = fields
+
+    return JournalEntry(state, assetid, relation_type, int(request_id), int(relation_id))
+
+
+class SendJournal(object):
+    # Append-only record of every send, written before the next step runs, so a run that died
+    # between Steam and the backend can be finished from it. Only the last state of an asset counts.
+    #
+    # Every line goes to an fsync'd local file and to a log in the shared cache: a length counter
+    # and one key per line. The shared log is what a run reads, so an account picked up by another
+    # node after its node died finishes the same outstanding sends. The local file is only read
+    # when the shared log is gone from the cache.
+
+    def __init__(self, account_name, journal_dir=None):
+        self.path = os.path.join(
+            journal_dir or getattr(config, 'SEND_JOURNAL_DIR', SEND_JOURNAL_DIR),
+            u'{}.journal'.format(account_name)
+        )
+
+        self.cache_key = u'delivery/journal/{0}'.format(account_name)
+        self.length_cache_key = u'{0}/length'.format(self.cache_key)
+        self.cache_timeout = getattr(config, 'SEND_JOURNAL_CACHE_TIMEOUT_SECONDS', SEND_JOURNAL_CACHE_TIMEOUT_SECONDS)
+
+        self.entries = None
+        self.file = None
+        self.lock = threading.Lock()
+
+    def get_line_cache_key(self, position):
+        return u'{0}/{1}'.format(self.cache_key, position)
+
+    def reload(self):
+        # Another node may have written to the shared log since it was read
+
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+            self.entries = None
+
+    def load(self):
+        if self.entries is not None:
+            return self.entries
+
+        self.entries = self.load_shared()
+
+        if self.entries is not None:
+            self.write_file(self.entries.values())
+
+            return self.entries
+
+        self.entries = self.load_file()
+
+        if self.entries:
+            log.info(u'Shared send journal is missing, restoring it from {}'.format(self.path))
+
+        self.write_shared(self.entries.values())
+
+        return self.entries
+
+    def load_shared(self):
+        length = cache.get(self.length_cache_key)
+
+        if length is None:
+            return None
+
+        entries = collections.OrderedDict()
+        keys = [self.get_line_cache_key(position) for position in range(1, int(length) + 1)]
+
+        for line in cache.get_many(*keys) if keys else []:
+            entry = parse_line(line) if line else None
+
+            if entry:
+                entries[entry.assetid] = entry
+
+        return entries
+
+    def load_file(self):
+        entries = collections.OrderedDict()
+
+        if not os.path.exists(self.path):
+            return entries
+
+        with open(self.path, 'r') as f:
+            for line in f:
+                entry = parse_line(line)
+
+                if entry:
+                    entries[entry.assetid] = entry
+
+        return entries
+
+    def write_shared(self, entries):
+        # Lines past the new length are left to expire, readers never get to them
+
+        entries = list(entries)
+
+        for position, entry in enumerate(entries, 1):
+            cache.set(self.get_line_cache_key(position), format_line(entry), timeout=self.cache_timeout)
+
+        cache.set(self.length_cache_key, len(entries), timeout=self.cache_timeout)
+
+    def write_file(self, entries):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        entries = list(entries)
+
+        if not entries and not os.path.exists(self.path):
+            return
+
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+
+        temporary_path = u'{}.tmp'.format(self.path)
+
+        with open(temporary_path, 'w') as f:
+            for entry in entries:
+                f.write(format_line(entry))
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.rename(temporary_path, self.path)
+
+    def get_entries(self, state):
+        with self.lock:
+            return [entry for entry in self.load().values() if entry.state == state]
+
+    def get_journaled_assetids(self):
+        # Assets that must not be planned again, everything but failed sends
+
+        with self.lock:
+            return set(entry.assetid for entry in self.load().values() if entry.state != Failed)
+
+    def record(self, state, assetid, relation_type, request_id, relation_id):
+        entry = JournalEntry(state, assetid, relation_type, request_id, relation_id)
+
+        with self.lock:
+            self.load()
+
+            if self.file is None:
+                if not os.path.isdir(os.path.dirname(self.path)):
+                    os.makedirs(os.path.dirname(self.path))
+
+                self.file = open(self.path, 'a')
+
+            self.file.write(format_line(entry))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+            position = cache.inc(self.length_cache_key)
+
+            cache.set(self.get_line_cache_key(position), format_line(entry), timeout=self.cache_timeout)
+
+            self.entries[assetid] = entry
+
+            # The shared log expired since it was read, the counter started over
+
+            if position == 1 and len(self.entries) > 1:
+                self.write_shared(self.entries.values())
+
+    def compact(self):
+        # Rewrites both journals with only the sends that are still outstanding
+
+        with self.lock:
+            entries = [entry for entry in self.load().values() if entry.state in (Planned, Submitted)]
+
+            # The shared log first, a crash in between leaves the file with more lines than needed
+
+            self.write_shared(entries)
+            self.write_file(entries)
+
+            self.entries = collections.OrderedDict((entry.assetid, entry) for entry in entries)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import uuid
+import config
+import logging
+import threading
+
+from steamcommerce_api.cache import cache
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+LEASE_TIMEOUT_SECONDS = 2 * 60
+LEASE_HEARTBEAT_SECONDS = 30
+
+
+def get_bot_lock_key(account_name):
+    return 'bot/lock/{0}'.format(account_name)
+
+
+class Lease(object):
+    # An expiring lock in the shared cache. It is taken with an atomic add holding a random owner
+    # token, kept alive by a heartbeat thread and only renewed or released by its owner.
+    #
+    # The cache has no compare-and-set, so renew and release read the token back before they write.
+    # A holder stalled past the timeout between that read and the write can still overwrite or
+    # delete the lease another runner took in the meantime. With the default timeout and heartbeat
+    # a lease read back as held has at least 90 seconds left, unless a renewal failed before.
+
+    def __init__(self, cache_key, timeout=None, heartbeat_seconds=None):
+        self.cache_key = cache_key
+        self.timeout = timeout or getattr(config, 'LEASE_TIMEOUT_SECONDS', LEASE_TIMEOUT_SECONDS)
+        self.heartbeat_seconds = heartbeat_seconds or getattr(
+            config,
+            'LEASE_HEARTBEAT_SECONDS',
+            LEASE_HEARTBEAT_SECONDS
+        )
+
+        self.token = None
+        self.heartbeat = None
+        self.stop_event = threading.Event()
+
+    def get_holder(self):
+        return cache.get(self.cache_key)
+
+    def is_present(self):
+        return bool(self.get_holder() or 0)
+
+    def is_held(self):
+        return self.token is not None and self.get_holder() == self.token
+
+    def acquire(self):
+        token = uuid.uuid4().hex
+
+        if not cache.add(self.cache_key, token, timeout=self.timeout):
+            return False
+
+        self.token = token
+        self.start_heartbeat()
+
+        return True
+
+    def renew(self):
+        # A lease that expired and was taken by someone else is given up instead of being overwritten
+
+        if not self.is_held():
+            if self.token is not None:
+                log.error(u'Lost lease {}'.format(self.cache_key))
+
+            self.token = None
+
+            return False
+
+        cache.set(self.cache_key, self.token, timeout=self.timeout)
+
+        return True
+
+    def release(self):
+        self.stop_heartbeat()
+
+        if self.is_held():
+            cache.delete(self.cache_key)
+
+        self.token = None
+
+    def start_heartbeat(self):
+        self.stop_heartbeat()
+        self.stop_event = threading.Event()
+
+        self.heartbeat = threading.Thread(
+            target=self.run_heartbeat,
+            args=(self.stop_event,),
+            name='lease {}'.format(self.cache_key)
+        )
+
+        self.heartbeat.daemon = True
+        self.heartbeat.start()
+
+    def stop_heartbeat(self):
+        self.stop_event.set()
+
+        if self.heartbeat and self.heartbeat is not threading.current_thread():
+            self.heartbeat.join()
+
+        self.heartbeat = None
+
+    def run_heartbeat(self, stop_event):
+        while not stop_event.wait(self.heartbeat_seconds):
+            try:
+                if not self.renew():
+                    return
+            except Exception, e:
+                log.error(u'Could not renew lease {0}: {1}'.format(self.cache_key, e))
@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+from steamcommerce_api.api import logger
+
+# Set up once, the runners log through it before the bot module is imported
+
+log = logger.Logger('steamcommerce.delivery.bot', 'steamcommerce.delivery.bot.log').get_logger()
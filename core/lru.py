@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import time
+import threading
+import collections
+
+
+class LRUCache(object):
+    # In-process cache holding at most max_size entries, evicting the least recently used first
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+
+            if expires_at and expires_at < time.time():
+                return default
+
+            self.entries[key] = entry
+
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, time.time() + timeout if timeout else None)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
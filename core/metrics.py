@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import os
+import time
+import socket
+import config
+import logging
+import functools
+import threading
+import contextlib
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+'''
+    Counters and timers labeled by account, phase and endpoint. They are kept in
+    memory per process and exported as a Prometheus textfile, to StatsD or both.
+
+    config.METRICS_TEXTFILE_DIR = '/var/lib/node_exporter'  # writes <dir>/<name>.prom after every run
+    config.STATSD_HOST = 'localhost'  # every observation is also sent over UDP
+    config.STATSD_PORT = 8125
+    config.STATSD_PREFIX = 'steamcommerce.delivery'
+'''
+
+METRIC_PREFIX = 'delivery_'
+STATSD_PORT = 8125
+STATSD_PREFIX = 'steamcommerce.delivery'
+
+
+class Registry(object):
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+        self.lock = threading.Lock()
+
+        self.statsd_address = None
+        self.statsd_socket = None
+
+        if getattr(config, 'STATSD_HOST', None):
+            self.statsd_address = (config.STATSD_HOST, getattr(config, 'STATSD_PORT', STATSD_PORT))
+            self.statsd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def get_key(self, name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        key = self.get_key(name, labels)
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+        self.send_statsd(name, labels, value, 'c')
+
+    def observe(self, name, seconds, **labels):
+        key = self.get_key(name, labels)
+
+        with self.lock:
+            total, count = self.timers.get(key, (0.0, 0))
+            self.timers[key] = (total + seconds, count + 1)
+
+        self.send_statsd(name, labels, int(seconds * 1000), 'ms')
+
+    def send_statsd(self, name, labels, value, metric_type):
+        if not self.statsd_socket:
+            return
+
+        # StatsD has no labels, their values become part of the metric path
+
+        path = '.'.join(
+            [getattr(config, 'STATSD_PREFIX', STATSD_PREFIX), name] +
+            [unicode(labels[label]).replace('.', '_') for label in sorted(labels.keys())]
+        )
+
+        try:
+            self.statsd_socket.sendto(u'{0}:{1}|{2}'.format(path, value, metric_type).encode('utf-8'), self.statsd_address)
+        except socket.error, e:
+            log.error(u'Could not send metric {0} to StatsD: {1}'.format(path, e))
+
+    def format_labels(self, labels):
+        if not labels:
+            return ''
+
+        return u'{{{}}}'.format(u','.join(
+            u'{0}="{1}"'.format(
+                label,
+                unicode(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            )
+            for label, value in labels
+        ))
+
+    def render(self):
+        # Prometheus text exposition format, timers are exported as summaries without quantiles
+
+        with self.lock:
+            counters = dict(self.counters)
+            timers = dict(self.timers)
+
+        lines = []
+
+        for name in sorted(set(name for name, labels in counters.keys())):
+            lines.append(u'# TYPE {0}{1} counter'.format(METRIC_PREFIX, name))
+
+            for key in sorted(key for key in counters.keys() if key[0] == name):
+                lines.append(u'{0}{1}{2} {3}'.format(METRIC_PREFIX, name, self.format_labels(key[1]), counters[key]))
+
+        for name in sorted(set(name for name, labels in timers.keys())):
+            lines.append(u'# TYPE {0}{1} summary'.format(METRIC_PREFIX, name))
+
+            for key in sorted(key for key in timers.keys() if key[0] == name):
+                total, count = timers[key]
+
+                lines.append(u'{0}{1}_sum{2} {3:.6f}'.format(METRIC_PREFIX, name, self.format_labels(key[1]), total))
+                lines.append(u'{0}{1}_count{2} {3}'.format(METRIC_PREFIX, name, self.format_labels(key[1]), count))
+
+        return u'\n'.join(lines) + u'\n'
+
+    def write_textfile(self, name):
+        textfile_dir = getattr(config, 'METRICS_TEXTFILE_DIR', None)
+
+        if not textfile_dir:
+            return None
+
+        path = os.path.join(textfile_dir, u'{}.prom'.format(name))
+        temporary_path = u'{0}.{1}.tmp'.format(path, os.getpid())
+
+        # Written aside and renamed so the collector never reads a half written file
+
+        with open(temporary_path, 'w') as f:
+            f.write(self.render().encode('utf-8'))
+
+        os.rename(temporary_path, path)
+
+        return path
+
+
+registry = Registry()
+
+
+def increment(name, value=1, **labels):
+    registry.increment(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    registry.observe(name, seconds, **labels)
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    started = time.time()
+
+    try:
+        yield
+    finally:
+        registry.observe(name, time.time() - started, **labels)
+
+
+def timed(name, **labels):
+    # Method decorator, the account label is taken from the instance
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with timer(name, account=self.account_name, **labels):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def write_textfile(name):
+    return registry.write_textfile(name)
+
+
+class InstrumentedApi(object):
+    # Wraps a steamcommerce_api object so every method call is counted and timed as a DB call
+
+    def __init__(self, api, account_name):
+        self.api = api
+        self.account_name = account_name
+
+    def __getattr__(self, attribute):
+        value = getattr(self.api, attribute)
+
+        if not callable(value):
+            return value
+
+        def wrapper(*args, **kwargs):
+            with timer(
+                'db_call_seconds',
+                account=self.account_name,
+                api=self.api.__class__.__name__,
+                method=attribute
+            ):
+                return value(*args, **kwargs)
+
+        return wrapper
+
+
+def api(instance, account_name):
+    return InstrumentedApi(instance, account_name)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import re
+import json
+import HTMLParser
+
+# A linear scanner for the pending gifts tab of /my/inventory. Only the
+# #tabcontent_pendinggifts section is walked, div by div, instead of building a
+# DOM for the whole inventory page.
+
+DIV_TAG = re.compile(r'<(/?)(?:(div)|script)\b([^>]*)>', re.I)
+SCRIPT_END = '</script>'
+CLASS_ATTRIBUTE = re.compile(r'\bclass\s*=\s*"([^"]*)"', re.I)
+ID_ATTRIBUTE = re.compile(r'\bid\s*=\s*"([^"]*)"', re.I)
+ONCLICK_ATTRIBUTE = re.compile(r'\bonclick\s*=\s*"([^"]*)"', re.I)
+SCRIPT_ELEMENT = re.compile(r'<script\b[^>]*>(.*?)</script>', re.I | re.DOTALL)
+PARAGRAPH_ELEMENT = re.compile(r'<p\b[^>]*>(.*?)</p>', re.I | re.DOTALL)
+LINK_ELEMENT = re.compile(r'<a\b[^>]*\bhref\s*=\s*"([^"]*)"[^>]*>(.*?)</a>', re.I | re.DOTALL)
+ANY_TAG = re.compile(r'<[^>]+>')
+WHITESPACE = re.compile(r'\s+')
+
+html_parser = HTMLParser.HTMLParser()
+
+
+def has_class(attributes, class_name):
+    match = CLASS_ATTRIBUTE.search(attributes)
+
+    return bool(match) and class_name in match.group(1).split()
+
+
+def has_id(attributes, element_id):
+    match = ID_ATTRIBUTE.search(attributes)
+
+    return bool(match) and match.group(1) == element_id
+
+
+def iter_div_tags(html, start, end):
+    # Script bodies are stepped over, Steam writes divs inside the gift JSON with their
+    # closing tags escaped as <\/div>, counting them would leave the depth unbalanced
+
+    while True:
+        tag = DIV_TAG.search(html, start, end)
+
+        if not tag:
+            return
+
+        start = tag.end()
+
+        if tag.group(2):
+            yield tag
+        elif not tag.group(1):
+            script_end = html.find(SCRIPT_END, start, end)
+
+            if script_end == -1:
+                return
+
+            start = script_end + len(SCRIPT_END)
+
+
+def iter_divs(html, matches, start=0, end=None):
+    # Yields (attributes, inner_start, inner_end, outer_end) for every div matching, not nested in a previous match
+
+    end = len(html) if end is None else end
+    tags = iter_div_tags(html, start, end)
+
+    for tag in tags:
+        if tag.group(1) or not matches(tag.group(3)):
+            continue
+
+        depth = 1
+
+        for inner_tag in tags:
+            depth += -1 if inner_tag.group(1) else 1
+
+            if not depth:
+                yield tag.group(3), tag.end(), inner_tag.start(), inner_tag.end()
+
+                break
+        else:
+            return
+
+
+def find_div(html, matches, start=0, end=None):
+    for div in iter_divs(html, matches, start, end):
+        return div
+
+    return None
+
+
+def get_text(html):
+    return WHITESPACE.sub(' ', html_parser.unescape(ANY_TAG.sub('', html))).strip()
+
+
+class PendingGift(object):
+    def __init__(self, gift_javascript=None, from_link=None, from_username=None, accept_button=None):
+        self.gift_javascript = gift_javascript
+        self.from_link = from_link
+        self.from_username = from_username
+        self.accept_button = accept_button
+
+    @property
+    def gift_object(self):
+        # The second argument of BuildHover( 'pending_gift_iteminfo_<id>', {...}, UserYou ) is the gift JSON
+
+        if not self.gift_javascript:
+            return None
+
+        hover_index = self.gift_javascript.find('BuildHover(')
+        object_index = self.gift_javascript.find('{', hover_index)
+
+        if hover_index == -1 or object_index == -1:
+            return None
+
+        try:
+            gift_object, end = json.JSONDecoder().raw_decode(self.gift_javascript, object_index)
+        except ValueError:
+            return None
+
+        return gift_object
+
+
+def parse_pending_gift(html, start, end):
+    gift = PendingGift()
+
+    leftcol = find_div(html, lambda attributes: has_class(attributes, 'pending_gift_leftcol'), start, end)
+
+    if leftcol:
+        script = SCRIPT_ELEMENT.search(html, leftcol[1], leftcol[2])
+
+        if script:
+            gift.gift_javascript = script.group(1).strip()
+
+    rightcol = find_div(html, lambda attributes: has_class(attributes, 'pending_gift_rightcol'), start, end)
+
+    if not rightcol:
+        return gift
+
+    paragraph = PARAGRAPH_ELEMENT.search(html, rightcol[1], rightcol[2])
+    link = paragraph and LINK_ELEMENT.search(paragraph.group(1))
+
+    if link:
+        gift.from_link = html_parser.unescape(link.group(1))
+        gift.from_username = get_text(link.group(2))
+
+    buttons = find_div(
+        html,
+        lambda attributes: has_class(attributes, 'gift_controls_buttons'),
+        rightcol[1],
+        rightcol[2]
+    )
+
+    button = buttons and find_div(
+        html,
+        lambda attributes: has_class(attributes, 'btn_medium'),
+        buttons[1],
+        buttons[2]
+    )
+
+    if button:
+        onclick = ONCLICK_ATTRIBUTE.search(button[0])
+
+        if onclick:
+            gift.accept_button = html_parser.unescape(onclick.group(1))
+
+    return gift
+
+
+def parse_pending_gifts(html):
+    # Returns None when the pending gifts tab is missing from the page. The search jumps straight
+    # to the section instead of walking every inventory div before it
+
+    section_start = html.rfind('<div', 0, max(html.find('tabcontent_pendinggifts'), 0))
+
+    if section_start == -1:
+        return None
+
+    section = find_div(html, lambda attributes: has_id(attributes, 'tabcontent_pendinggifts'), section_start)
+
+    if not section:
+        return None
+
+    return [
+        parse_pending_gift(html, inner_start, inner_end)
+        for attributes, inner_start, inner_end, outer_end in iter_divs(
+            html,
+            lambda attributes: has_class(attributes, 'pending_gift'),
+            section[1],
+            section[2]
+        )
+    ]
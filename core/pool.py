@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import sys
+import Queue
+import threading
+
+
+class CancelledError(Exception):
+    pass
+
+
+class Task(object):
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+        self.value = None
+        self.exc_info = None
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            self.value = self.func(*self.args, **self.kwargs)
+        except Exception:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.finished.set()
+
+    def done(self):
+        return self.finished.is_set()
+
+    def cancel(self):
+        # Only for tasks no worker picked up yet
+
+        try:
+            raise CancelledError('Task was cancelled before it started')
+        except CancelledError:
+            self.exc_info = sys.exc_info()
+
+        self.finished.set()
+
+    def result(self, timeout=None):
+        if not self.finished.wait(timeout):
+            raise RuntimeError('Task did not finish after {} seconds'.format(timeout))
+
+        if self.exc_info:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+        return self.value
+
+
+class WorkerPool(object):
+    # A fixed number of daemon threads consuming submitted tasks in order
+
+    def __init__(self, max_workers):
+        self.tasks = Queue.Queue()
+        self.workers = []
+
+        for i in range(max(max_workers, 1)):
+            worker = threading.Thread(target=self.work)
+            worker.daemon = True
+            worker.start()
+
+            self.workers.append(worker)
+
+    def work(self):
+        while True:
+            task = self.tasks.get()
+
+            if task is None:
+                return
+
+            task.run()
+
+    def submit(self, func, *args, **kwargs):
+        task = Task(func, args, kwargs)
+        self.tasks.put(task)
+
+        return task
+
+    def map(self, func, values):
+        tasks = [self.submit(func, value) for value in values]
+
+        return [task.result() for task in tasks]
+
+    def cancel(self):
+        # Drops every task still waiting for a worker, the running ones finish
+
+        while True:
+            try:
+                task = self.tasks.get_nowait()
+            except Queue.Empty:
+                return
+
+            if task is None:
+                self.tasks.put(None)
+
+                return
+
+            task.cancel()
+
+    def shutdown(self):
+        for worker in self.workers:
+            self.tasks.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
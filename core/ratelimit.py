@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import time
+import config
+import logging
+import threading
+import collections
+
+from steamcommerce_api.cache import cache
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+# Endpoint family: (calls, per window of seconds) shared by every bot
+
+STEAM_RATE_LIMITS = {
+    'inventory': (5, 10),
+    'validateunpack': (20, 10),
+    'gifts': (10, 10),
+    'sendgiftsubmit': (10, 10)
+}
+
+
+class SharedRateLimiter(object):
+    # Sliding window limits per Steam endpoint family kept in the shared cache, so every bot on every
+    # node draws from the same budget. Calls are counted per fixed window of `window_seconds` and a call
+    # is let through while the current window's count plus the previous window's, weighted by the part
+    # of it still inside the last `window_seconds`, stays within `tokens`. A burst at the end of a window
+    # therefore holds back the start of the next one. The weighting takes the previous window's calls as
+    # evenly spread, so the estimate is not exact. Endpoint families without a limit are not throttled.
+
+    def __init__(self, limits=None):
+        self.limits = dict(STEAM_RATE_LIMITS)
+        self.limits.update(limits or getattr(config, 'STEAM_RATE_LIMITS', {}))
+
+        self.waited = collections.defaultdict(float)
+        self.lock = threading.Lock()
+
+    def get_blocked_cache_key(self, endpoint):
+        return 'ratelimit/{0}/blocked_until'.format(endpoint)
+
+    def get_window_cache_key(self, endpoint, window):
+        return 'ratelimit/{0}/{1}'.format(endpoint, window)
+
+    def take_token(self, endpoint, now):
+        # Returns 0 when the call is allowed, otherwise the seconds to wait before asking again
+
+        tokens, window_seconds = self.limits[endpoint]
+        window = int(now // window_seconds)
+        elapsed = now / window_seconds - window  # part of the current window gone by
+        cache_key = self.get_window_cache_key(endpoint, window)
+
+        # The window counter is created with an expiry first, incrementing is atomic on the cache backend.
+        # It is kept through the next window, which weighs it in.
+
+        cache.add(cache_key, 0, timeout=window_seconds * 2)
+
+        current = cache.inc(cache_key) or 0
+        previous = int(cache.get(self.get_window_cache_key(endpoint, window - 1)) or 0)
+
+        if previous * (1 - elapsed) + current <= tokens:
+            return 0
+
+        # Not allowed, the call is taken back so it does not count against the others
+
+        cache.inc(cache_key, -1)
+
+        if current > tokens or not previous:
+            return (1 - elapsed) * window_seconds
+
+        # The previous window weighs less as the current one goes by, until this call fits
+
+        return (1 - float(tokens - current) / previous - elapsed) * window_seconds
+
+    def acquire(self, endpoint):
+        # Blocks until a call to endpoint is allowed and returns the seconds spent waiting
+
+        if endpoint not in self.limits:
+            return 0
+
+        started = time.time()
+
+        while True:
+            now = time.time()
+            delay = float(cache.get(self.get_blocked_cache_key(endpoint)) or 0) - now
+
+            if delay <= 0:
+                delay = self.take_token(endpoint, now)
+
+            if delay <= 0:
+                break
+
+            time.sleep(delay)
+
+        waited = time.time() - started
+
+        with self.lock:
+            self.waited[endpoint] += waited
+
+        return waited
+
+    def block(self, endpoint, seconds):
+        # Honors a Retry-After answer: nobody calls endpoint again before it expires
+
+        log.info(u'Steam asked to retry {0} after {1} seconds'.format(endpoint, seconds))
+
+        cache.set(self.get_blocked_cache_key(endpoint), time.time() + seconds, timeout=int(seconds) + 1)
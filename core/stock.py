@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import json
+import time
+import config
+import logging
+
+from steamcommerce_api.cache import cache
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+STOCK_INDEX_TIMEOUT_SECONDS = 24 * 60 * 60
+STOCK_INDEX_MAX_AGE_SECONDS = 10 * 60
+
+
+def get_cache_key(owner_id, account_name):
+    return u'delivery/stock/{0}/{1}'.format(owner_id, account_name)
+
+
+def get_version_cache_key(owner_id, account_name):
+    return u'{0}/version'.format(get_cache_key(owner_id, account_name))
+
+
+def get_relation_key(relation_type, relation_id):
+    return u'{0}-{1}'.format(relation_type, relation_id)
+
+
+def build_index(unsent_items, excluded_assetids=()):
+    items = {}
+
+    for sub_id, sub_items in unsent_items.items():
+        assetids = [item.assetid for item in sub_items if item.assetid not in excluded_assetids]
+
+        if assetids:
+            items[str(sub_id)] = assetids
+
+    return items
+
+
+def read_indexes(owner_id, account_names):
+    # One cache round trip for every account of an owner, accounts without an index are left out
+
+    values = cache.get_many(*[get_cache_key(owner_id, account_name) for account_name in account_names])
+
+    return dict(
+        (account_name, json.loads(value))
+        for account_name, value in zip(account_names, values) if value
+    )
+
+
+def get_stock_counts(owner_id, account_names):
+    # sub_id -> unsent gifts held by all the given accounts of an owner
+
+    counts = {}
+
+    for index in read_indexes(owner_id, account_names).values():
+        for sub_id, assetids in index['items'].items():
+            counts[sub_id] = counts.get(sub_id, 0) + len(assetids)
+
+    return counts
+
+
+class StockIndex(object):
+    # The unsent gifts of one bot account by sub_id, as of its last inventory fetch. Each publish
+    # stamps the index with the next value of a counter that is never reset, so readers can tell
+    # a newer index from an older one, with the time it was published and with the relations
+    # that were pending when it was, the only ones whose subs it is known to have been checked for.
+
+    def __init__(self, owner_id, account_name):
+        self.owner_id = owner_id
+        self.account_name = account_name
+        self.cache_key = get_cache_key(owner_id, account_name)
+        self.version_cache_key = get_version_cache_key(owner_id, account_name)
+
+    def publish(self, unsent_items, excluded_assetids=(), relation_keys=()):
+        index = {
+            'version': cache.inc(self.version_cache_key),
+            'published_at': time.time(),
+            'relations': sorted(relation_keys),
+            'items': build_index(unsent_items, excluded_assetids)
+        }
+
+        cache.set(
+            self.cache_key,
+            json.dumps(index),
+            timeout=getattr(config, 'STOCK_INDEX_TIMEOUT_SECONDS', STOCK_INDEX_TIMEOUT_SECONDS)
+        )
+
+        return index
+
+    def read(self):
+        cached = cache.get(self.cache_key)
+
+        return json.loads(cached) if cached else None
+
+    def read_recent(self):
+        # The index if it is recent enough to decide on without fetching the inventory
+
+        index = self.read()
+        max_age = getattr(config, 'STOCK_INDEX_MAX_AGE_SECONDS', STOCK_INDEX_MAX_AGE_SECONDS)
+
+        if index is None or time.time() - index['published_at'] > max_age:
+            return None
+
+        return index
+
+    def covers(self, index, relation_keys):
+        # A relation that became pending after the index was published may be for a gift it does not list
+
+        return set(relation_keys) <= set(index.get('relations') or ())
+
+    def clear(self):
+        cache.delete(self.cache_key)
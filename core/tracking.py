@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import config
+import logging
+import threading
+import collections
+
+from core import metrics
+
+from steamcommerce_api.api import asset as asset_api
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+TRACKING_FLUSH_EVENTS = 200
+
+
+class TrackingBuffer(object):
+    # Collects AssetTracking events during a phase and writes them in one pass.
+    # Events for the same asset are merged: the tracking is looked up once, every
+    # history state is kept in order and the tracking fields are updated once.
+    # The buffer is also written every TRACKING_FLUSH_EVENTS events, so a process
+    # killed half way through a phase only loses the events since the last write.
+    # That write runs on a background thread, the Steam call that recorded the event
+    # does not wait for the backend.
+
+    def __init__(self, account_name=None):
+        self.account_name = account_name
+        self.entries = collections.OrderedDict()
+        self.events = 0
+        self.flush_events = getattr(config, 'TRACKING_FLUSH_EVENTS', TRACKING_FLUSH_EVENTS)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_thread = None
+
+    def record(self, assetid=None, tracking_id=None, state=None, relation_type=None, relation_id=None, **fields):
+        key = self.get_key(assetid, tracking_id)
+
+        with self.lock:
+            entry = self.entries.setdefault(key, {
+                'assetid': assetid,
+                'tracking_id': tracking_id,
+                'create_kwargs': {},
+                'states': [],
+                'fields': {}
+            })
+
+            if relation_type and relation_id:
+                entry['create_kwargs'].update(relation_type=relation_type, relation_id=relation_id)
+
+            if state is not None:
+                entry['states'].append(state)
+
+            entry['fields'].update(fields)
+
+            self.events += 1
+
+            # One background write at a time, events recorded meanwhile wait for the next one
+
+            if self.events >= self.flush_events and not (self.flush_thread and self.flush_thread.is_alive()):
+                self.flush_thread = threading.Thread(target=self.flush_in_background, name='tracking writer')
+                self.flush_thread.daemon = True
+                self.flush_thread.start()
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        except Exception, e:
+            # What was not written stays buffered for the flush at the end of the phase
+
+            log.error(u'Unable to write asset trackings, retrying later: {}'.format(e))
+
+    def flush(self):
+        # One flush at a time, so the history states of an asset are written in order. A flush
+        # that has to wait for a background write then writes whatever that one left
+
+        with self.flush_lock:
+            return self.write()
+
+    def write(self):
+        with self.lock:
+            entries = self.entries.items()
+            self.entries = collections.OrderedDict()
+            self.events = 0
+
+        if not entries:
+            return 0
+
+        log.info(u'Writing {} asset trackings'.format(len(entries)))
+
+        api = metrics.api(asset_api.AssetTracking(), self.account_name)
+
+        for i, (key, entry) in enumerate(entries):
+            try:
+                # The entry is trimmed as it is written, so a retry only writes what is left of it
+
+                if not entry['tracking_id']:
+                    entry['tracking_id'] = api.get_or_create(entry['assetid'], **entry['create_kwargs'])
+
+                while entry['states']:
+                    api.create_history(entry['tracking_id'], entry['states'][0])
+                    entry['states'].pop(0)
+
+                if entry['fields']:
+                    api.update_tracking(id=entry['tracking_id'], **entry['fields'])
+                    entry['fields'] = {}
+            except:
+                # Keep what was not written, the failed entry included, so the next flush retries it.
+                # Events recorded since the swap come after them.
+
+                with self.lock:
+                    recorded = self.entries
+                    self.entries = collections.OrderedDict(entries[i:])
+
+                    for recorded_key, recorded_entry in recorded.items():
+                        if recorded_key in self.entries:
+                            self.merge_entry(self.entries[recorded_key], recorded_entry)
+                        else:
+                            self.entries[recorded_key] = recorded_entry
+
+                raise
+
+        return len(entries)
+
+    def merge_entry(self, entry, newer_entry):
+        entry['create_kwargs'].update(newer_entry['create_kwargs'])
+        entry['states'].extend(newer_entry['states'])
+        entry['fields'].update(newer_entry['fields'])
+
+    def get_key(self, assetid, tracking_id):
+        if tracking_id:
+            return ('tracking', tracking_id)
+
+        return ('asset', assetid)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import time
+import random
+import config
+import logging
+import requests
+import threading
+
+import enums
+
+from core import metrics
+from core import ratelimit
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+# Per endpoint family: request timeout in seconds and how many times a failed call is retried.
+# Only calls that are safe to repeat are retried. Entries in config.TRANSPORT_ENDPOINTS override these.
+
+ENDPOINTS = {
+    'session': {'timeout': 15, 'retries': 2},
+    'inventory': {'timeout': getattr(config, 'INVENTORY_DEFAULT_TIMEOUT_SECONDS', 30), 'retries': 3},
+    'validateunpack': {'timeout': 15, 'retries': 2},
+    'pendinggifts': {'timeout': 30, 'retries': 2},
+    'gifts': {'timeout': 20, 'retries': 0},
+    'sendgiftsubmit': {'timeout': 30, 'retries': 0}
+}
+
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 10
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 60
+DEFAULT_RETRY_AFTER_SECONDS = 60
+
+
+class CircuitBreaker(object):
+    # Opens after failure_threshold consecutive failed calls. Once reset_seconds have passed
+    # a single trial call is let through, which closes the circuit again if it succeeds.
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if time.time() - self.opened_at < self.reset_seconds:
+                return False
+
+            # Half open, push the next trial further away until this one reports back
+
+            self.opened_at = time.time()
+
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+
+
+class Transport(object):
+    def __init__(self, session=None, account_name=None):
+        self.session = None
+        self.account_name = account_name
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.limiter = ratelimit.SharedRateLimiter()
+
+        self.endpoints = dict(ENDPOINTS)
+        self.endpoints.update(getattr(config, 'TRANSPORT_ENDPOINTS', {}))
+
+        if session:
+            self.set_session(session)
+
+    def set_session(self, session):
+        # Keep-alive pools are sized so every concurrent worker of an account gets a connection
+
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=getattr(config, 'TRANSPORT_POOL_CONNECTIONS', POOL_CONNECTIONS),
+            pool_maxsize=getattr(config, 'TRANSPORT_POOL_MAXSIZE', POOL_MAXSIZE)
+        )
+
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        self.session = session
+
+    def get_breaker(self, endpoint):
+        with self.lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(
+                    getattr(config, 'CIRCUIT_FAILURE_THRESHOLD', CIRCUIT_FAILURE_THRESHOLD),
+                    getattr(config, 'CIRCUIT_RESET_SECONDS', CIRCUIT_RESET_SECONDS)
+                )
+
+            return self.breakers[endpoint]
+
+    def get_backoff(self, attempt):
+        # Exponential backoff with full jitter
+
+        return random.uniform(0, min(BACKOFF_BASE_SECONDS * 2 ** attempt, BACKOFF_MAX_SECONDS))
+
+    def get_retry_after(self, response):
+        # Only the delay-seconds form of Retry-After is used, dates fall back to the default
+
+        try:
+            return max(int(response.headers.get('Retry-After')), 1)
+        except (TypeError, ValueError):
+            return DEFAULT_RETRY_AFTER_SECONDS
+
+    def request(self, endpoint, method, url, **kwargs):
+        # Returns the response, or a WebAccountResult when no response could be obtained.
+        # Server errors and 429 answers are retried like timeouts and the last response is returned.
+
+        settings = self.endpoints[endpoint]
+        breaker = self.get_breaker(endpoint)
+
+        if not breaker.allow():
+            log.error(u'Not calling {0} endpoint, circuit is open. Skipped {1}'.format(endpoint, url))
+
+            return enums.WebAccountResult.CircuitOpen
+
+        kwargs.setdefault('timeout', settings['timeout'])
+
+        for attempt in range(settings['retries'] + 1):
+            if attempt:
+                time.sleep(self.get_backoff(attempt - 1))
+
+            metrics.observe(
+                'rate_limit_wait_seconds',
+                self.limiter.acquire(endpoint),
+                account=self.account_name,
+                endpoint=endpoint
+            )
+
+            try:
+                with metrics.timer('http_request_seconds', account=self.account_name, endpoint=endpoint):
+                    result = self.session.request(method, url, **kwargs)
+            except requests.exceptions.Timeout:
+                log.error(u'Request to {0} timed out after {1} seconds'.format(url, kwargs['timeout']))
+
+                result = enums.WebAccountResult.Timeout
+            except Exception, e:
+                log.error(u'Request to {0} raised {1}'.format(url, e))
+
+                result = enums.WebAccountResult.UnknownException
+
+            metrics.increment(
+                'http_requests_total',
+                account=self.account_name,
+                endpoint=endpoint,
+                status=result.name if type(result) is enums.WebAccountResult else result.status_code
+            )
+
+            if type(result) is enums.WebAccountResult:
+                continue
+
+            if result.status_code == 429:
+                log.error(u'Request to {0} was rate limited'.format(url))
+
+                self.limiter.block(endpoint, self.get_retry_after(result))
+
+                continue
+
+            if result.status_code < 500:
+                breaker.record_success()
+
+                return result
+
+            log.error(u'Request to {0} received {1}'.format(url, result.status_code))
+
+        breaker.record_failure()
+
+        return result
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import json
+import config
+import logging
+
+import enums
+
+from core import lru
+from core import pool
+
+from steamcommerce_api.cache import cache
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+UNPACK_MAX_WORKERS = 4
+UNPACK_LOCAL_CACHE_SIZE = 50000
+UNPACK_NEGATIVE_TIMEOUT_SECONDS = 15 * 60
+UNPACK_PREFETCH_CHUNK_SIZE = 1000
+
+# Steam refusing the unpack is an answer about the asset that holds for every node. A timeout,
+# an open circuit or a response that could not be read only says something about this request.
+
+NEGATIVE_CACHED_RESULTS = (enums.WebAccountResult.Failed.value,)
+
+# Shared by every account in the process so repeated runs skip the shared cache entirely
+
+local_cache = lru.LRUCache(getattr(config, 'UNPACK_LOCAL_CACHE_SIZE', UNPACK_LOCAL_CACHE_SIZE))
+
+
+class UnpackCache(object):
+    # Unpack results live in the in-process LRU first and in the shared cache second.
+    # Unpacks Steam refused are stored as {"failed": <WebAccountResult value>} with a short timeout,
+    # other failures are not cached so the next fetch asks again.
+
+    def get_cache_key(self, assetid):
+        return 'delivery/validateunpack/{}'.format(assetid)
+
+    def load(self, assetid, cached):
+        data = json.loads(cached)
+
+        if 'failed' in data:
+            # Written before only Steam refusals were cached
+
+            if data['failed'] not in NEGATIVE_CACHED_RESULTS:
+                return None
+
+            local_cache.set(assetid, data['failed'], timeout=self.get_negative_timeout())
+
+            return data['failed']
+
+        local_cache.set(assetid, data)
+
+        return data
+
+    def get_negative_timeout(self):
+        return getattr(config, 'UNPACK_NEGATIVE_TIMEOUT_SECONDS', UNPACK_NEGATIVE_TIMEOUT_SECONDS)
+
+    def prefetch(self, assetids):
+        missing = [assetid for assetid in assetids if local_cache.get(assetid) is None]
+
+        for i in range(0, len(missing), UNPACK_PREFETCH_CHUNK_SIZE):
+            chunk = missing[i:i + UNPACK_PREFETCH_CHUNK_SIZE]
+            values = cache.get_many(*[self.get_cache_key(assetid) for assetid in chunk])
+
+            for assetid, cached in zip(chunk, values):
+                if cached:
+                    self.load(assetid, cached)
+
+    def get(self, assetid):
+        # Only the in-process LRU is read, prefetch loads the shared cache entries into it
+
+        return local_cache.get(assetid)
+
+    def set(self, assetid, unpack_data):
+        local_cache.set(assetid, unpack_data)
+        cache.set(self.get_cache_key(assetid), json.dumps(unpack_data))
+
+    def set_failure(self, assetid, result):
+        if result not in NEGATIVE_CACHED_RESULTS:
+            return
+
+        timeout = self.get_negative_timeout()
+
+        local_cache.set(assetid, result, timeout=timeout)
+        cache.set(self.get_cache_key(assetid), json.dumps({'failed': result}), timeout=timeout)
+
+
+class UnpackResolver(object):
+    # Resolves the sub of many gift assetids at once through validateunpack. The calls are throttled
+    # by the shared 'validateunpack' rate limit of the transport
+
+    def __init__(self, web_account, max_workers=None):
+        self.web_account = web_account
+        self.unpack_cache = UnpackCache()
+
+        self.max_workers = max_workers or getattr(config, 'UNPACK_MAX_WORKERS', UNPACK_MAX_WORKERS)
+
+    def resolve(self, assetids):
+        assetids = list(set(assetids))
+
+        unpacked = {}
+        uncached_assetids = []
+
+        self.unpack_cache.prefetch(assetids)
+
+        for assetid in assetids:
+            cached = self.unpack_cache.get(assetid)
+
+            if cached is None:
+                uncached_assetids.append(assetid)
+            else:
+                unpacked[assetid] = cached
+
+        if not uncached_assetids:
+            return unpacked
+
+        log.info(
+            u'Validate unpack for {0} assetids using {1} workers'.format(
+                len(uncached_assetids),
+                self.max_workers
+            )
+        )
+
+        with pool.WorkerPool(min(self.max_workers, len(uncached_assetids))) as workers:
+            results = workers.map(self.web_account.request_item_unpack, uncached_assetids)
+
+        unpacked.update(zip(uncached_assetids, results))
+
+        return unpacked
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import config
+import logging
+import threading
+
+from steamcommerce_api import config as backend_config
+from steamcommerce_api.cache import cache
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+VANITY_CACHE_TIMEOUT_SECONDS = 7 * 24 * 60 * 60
+
+web_api = None
+web_api_lock = threading.Lock()
+
+
+def get_web_api():
+    # Created on first use and shared by every bot in the process
+
+    global web_api
+
+    with web_api_lock:
+        if web_api is None:
+            from steam import WebAPI
+
+            web_api = WebAPI(backend_config.STEAM_API_KEY)
+
+    return web_api
+
+
+def get_cache_key(vanity_name):
+    return u'delivery/vanity/{}'.format(vanity_name.lower())
+
+
+def resolve_vanity_url(vanity_name):
+    try:
+        api_result = get_web_api().call(
+            'ISteamUser.ResolveVanityURL',
+            vanityurl=vanity_name,
+            url_type=1,
+            format='json'
+        )
+    except Exception, e:
+        log.error(u'Unable to call ResolveVanityURL for {0}. Raised {1}'.format(vanity_name, e))
+
+        return None
+
+    if (
+        not api_result.get('response') or
+        api_result.get('response').get('success') != 1
+    ):
+        log.error(
+            u'Unable to resolve sender steamid, ResolveVanityURL returned {}'.format(
+                api_result
+            )
+        )
+
+        return None
+
+    return api_result.get('response').get('steamid')
+
+
+def resolve_vanity_urls(vanity_names):
+    # Returns a vanity name -> steamid dictionary, names that could not be resolved are left out
+
+    vanity_names = list(set(vanity_names))
+
+    if not vanity_names:
+        return {}
+
+    steam_ids = {}
+    cached = cache.get_many(*[get_cache_key(vanity_name) for vanity_name in vanity_names])
+
+    for vanity_name, steam_id in zip(vanity_names, cached):
+        if steam_id:
+            steam_ids[vanity_name] = steam_id
+
+            continue
+
+        steam_id = resolve_vanity_url(vanity_name)
+
+        if not steam_id:
+            continue
+
+        steam_ids[vanity_name] = steam_id
+
+        cache.set(
+            get_cache_key(vanity_name),
+            steam_id,
+            timeout=getattr(config, 'VANITY_CACHE_TIMEOUT_SECONDS', VANITY_CACHE_TIMEOUT_SECONDS)
+        )
+
+    return steam_ids
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import sys
+import Queue
+import logging
+import threading
+
+log = logging.getLogger('steamcommerce.delivery.bot')
+
+BOOKKEEPING_QUEUE_SIZE = 1000
+
+
+class BookkeepingWriter(object):
+    # Applies events on one background thread in the order they were put, so the writes for a
+    # request never overtake each other. put blocks while the queue is full and close is the drain
+    # barrier: it returns once every event put before it was applied.
+    #
+    # The first failed event is re-raised by the next put and by raise_failure, the events queued
+    # after it are still applied.
+
+    def __init__(self, apply, max_size=BOOKKEEPING_QUEUE_SIZE):
+        self.apply = apply
+        self.events = Queue.Queue(max_size)
+        self.exc_info = None
+
+        self.thread = threading.Thread(target=self.work, name='bookkeeping writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def work(self):
+        while True:
+            event = self.events.get()
+
+            if event is None:
+                return
+
+            try:
+                self.apply(*event)
+            except Exception:
+                log.exception(u'Bookkeeping for {} failed'.format(repr(event)))
+
+                if not self.exc_info:
+                    self.exc_info = sys.exc_info()
+
+    def raise_failure(self):
+        if self.exc_info:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+    def put(self, *event):
+        self.raise_failure()
+        self.events.put(event)
+
+    def close(self):
+        self.events.put(None)
+        self.thread.join()
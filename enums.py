@@ -9,3 +9,11 @@ class WebAccountResult(IntEnum):
     UnknownException = 2
     ResponseNotSerializable = 3
     Failed = 4
+    CircuitOpen = 5
+
+
+class BotRunResult(IntEnum):
+    Finished = 1
+    Locked = 2
+    Crashed = 3
+    TimedOut = 4
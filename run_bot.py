@@ -1,12 +1,25 @@
 #!/usr/bin/env python
 # -*- coding:Utf-8 -*-
 
+from core import importtime
+
+importtime.start()
+
 import os
+import sys
 import json
-import rollbar
+import time
+import Queue
 import config
+import signal
+import multiprocessing
+
+import enums
 
-from core import bot
+from core import lease
+from core import metrics
+
+from core.logs import log
 
 '''
     config.BOTS example
@@ -19,8 +32,27 @@ from core import bot
             'data_path': 'data/bot.json'
         }
     ]
+
+    Optional runner settings
+
+    config.MAX_PARALLEL_BOTS = 4  # bots running at the same time, defaults to all of them
+    config.BOT_TIMEOUT_SECONDS = 9 * 60  # a bot still running after this is terminated
+    config.TERMINATE_GRACE_SECONDS = 30  # time a terminated bot gets to write its buffers before it is killed
+    config.TRACKING_FLUSH_EVENTS = 200  # asset tracking events buffered before they are written
+    config.STEAM_RATE_LIMITS = {'inventory': (5, 10)}  # calls per window of seconds, shared by all bots
+    config.PIPELINED_BOOKKEEPING = True  # backend writes after a send run on a background writer
+    config.ACCOUNT_MAX_IN_FLIGHT = 4  # Steam calls of one account running at the same time
+    config.STOCK_INDEX_MAX_AGE_SECONDS = 10 * 60  # a newer stock index without the pending subs skips the send
+
+    rollbar, steam, the parsers and the backend APIs are only imported once a bot
+    has an unlocked account, a run where every account is locked exits before that.
+    DELIVERY_IMPORT_TIME=1 in the environment logs what every module took to import.
 '''
 
+DEFAULT_BOT_TIMEOUT_SECONDS = 9 * 60
+TERMINATE_GRACE_SECONDS = 30
+POLL_INTERVAL_SECONDS = 0.5
+
 
 def file_to_json(path):
     f = open(os.path.join(os.getcwd(), path), 'r')
@@ -35,38 +67,211 @@ def file_to_json(path):
     return data
 
 
-def run_bot():
-    for BOT in config.BOTS:
-        data = file_to_json(BOT['data_path'])
-
-        delivery_bot = bot.DeliveryBot(
-            BOT['owner_id'],
-            data['account_name'],
-            data['password'],
-            data['shared_secret'],
-            use_2fa=BOT['use_2fa']
-        )
+def create_delivery_bot(BOT):
+    from core import bot
 
-        if delivery_bot.web_account.lock_is_present():
-            bot.log.info(
-                u'Cannot init session for {}. Lock is present'.format(
-                    data['account_name']
-                )
+    data = file_to_json(BOT['data_path'])
+
+    return bot.DeliveryBot(
+        BOT['owner_id'],
+        data['account_name'],
+        data['password'],
+        data['shared_secret'],
+        use_2fa=BOT['use_2fa']
+    )
+
+
+def run_delivery_bot(BOT):
+    delivery_bot = create_delivery_bot(BOT)
+
+    if delivery_bot.web_account.lock_is_present():
+        log.info(
+            u'Cannot init session for {}. Lock is present'.format(
+                delivery_bot.web_account.account_name
             )
+        )
 
-            continue
+        return enums.BotRunResult.Locked
 
-        delivery_bot.web_account.acquire_lock()
+    if not delivery_bot.web_account.acquire_lock():
+        log.info(
+            u'Lock for {} was taken by another runner'.format(delivery_bot.web_account.account_name)
+        )
+
+        return enums.BotRunResult.Locked
+
+    try:
         delivery_bot.web_account.init_session()
 
         delivery_bot.track_gifts()
         delivery_bot.accept_gifts()
         delivery_bot.send_gifts(only_use_special_emails=BOT['only_use_special_emails'])
-
+    finally:
         delivery_bot.web_account.release_lock()
+        delivery_bot.web_account.log_rate_limit_waits()
+
+        metrics.write_textfile(u'delivery_bot_{}'.format(delivery_bot.account_name))
+
+    return enums.BotRunResult.Finished
+
+
+def raise_system_exit(signum, frame):
+    # Unwinds the bot like an exception, so the finally blocks write the buffered tracking and release the lock
+
+    raise SystemExit(u'Terminated by signal {}'.format(signum))
+
+
+def bot_worker(BOT, results):
+    # Runs inside its own process so a crash only takes down this bot
+
+    import rollbar
+
+    signal.signal(signal.SIGTERM, raise_system_exit)
+
+    try:
+        result = run_delivery_bot(BOT)
+    except SystemExit:
+        # Terminated by the runner, which already counted the bot as timed out
+
+        log.error(u'Bot {} was terminated'.format(BOT['data_path']))
+
+        raise
+    except IOError:
+        rollbar.report_message(
+            'Got an IOError running bot {}'.format(BOT['data_path']),
+            'warning'
+        )
+
+        result = enums.BotRunResult.Crashed
+    except:
+        # catch-all
+
+        rollbar.report_exc_info()
+
+        result = enums.BotRunResult.Crashed
+
+    results.put((BOT['data_path'], result.value))
+
+
+def collect_results(results, summary):
+    while True:
+        try:
+            data_path, result = results.get_nowait()
+        except Queue.Empty:
+            return
+
+        summary[data_path]['result'] = enums.BotRunResult(result)
+
+
+def log_summary(summary):
+    log.info(u'Bot run summary')
+
+    for data_path in sorted(summary.keys()):
+        log.info(
+            u'{0}: {1} in {2:.2f} seconds'.format(
+                data_path,
+                summary[data_path]['result'].name,
+                summary[data_path]['elapsed']
+            )
+        )
+
+
+def all_bots_locked():
+    # Only the cache is read, so a tick where every account is busy ends without loading the bot stack.
+    # When the check fails the bots run and report the problem themselves.
+
+    try:
+        for BOT in config.BOTS:
+            data = file_to_json(BOT['data_path'])
+
+            if not data or not lease.Lease(lease.get_bot_lock_key(data['account_name'])).is_present():
+                return False
+    except Exception, e:
+        log.error(u'Could not check the bot locks: {}'.format(e))
+
+        return False
+
+    return bool(config.BOTS)
+
+
+def run_bot():
+    # Imported once here so the forked bot processes inherit it
+
+    from core import bot
+
+    importtime.report()
+
+    max_parallel = getattr(config, 'MAX_PARALLEL_BOTS', None) or len(config.BOTS) or 1
+    bot_timeout = getattr(config, 'BOT_TIMEOUT_SECONDS', DEFAULT_BOT_TIMEOUT_SECONDS)
+
+    pending = list(config.BOTS)
+    running = {}
+    summary = {}
+    results = multiprocessing.Queue()
+
+    while pending or running:
+        while pending and len(running) < max_parallel:
+            BOT = pending.pop(0)
+
+            process = multiprocessing.Process(target=bot_worker, args=(BOT, results))
+            process.daemon = True
+            process.start()
+
+            running[BOT['data_path']] = (process, time.time())
+
+            summary[BOT['data_path']] = {
+                'result': enums.BotRunResult.Crashed,
+                'elapsed': 0
+            }
+
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+        collect_results(results, summary)
+
+        for data_path, (process, started) in running.items():
+            elapsed = time.time() - started
+
+            if process.is_alive() and elapsed < bot_timeout:
+                continue
+
+            if process.is_alive():
+                log.error(
+                    u'Bot {0} did not finish after {1} seconds, terminating'.format(
+                        data_path,
+                        bot_timeout
+                    )
+                )
+
+                process.terminate()
+                summary[data_path]['result'] = enums.BotRunResult.TimedOut
+
+                process.join(getattr(config, 'TERMINATE_GRACE_SECONDS', TERMINATE_GRACE_SECONDS))
+
+                if process.is_alive():
+                    log.error(u'Bot {} did not exit after being terminated, killing it'.format(data_path))
+
+                    os.kill(process.pid, signal.SIGKILL)
+
+            process.join()
+
+            summary[data_path]['elapsed'] = elapsed
+            del running[data_path]
+
+    collect_results(results, summary)
+    log_summary(summary)
+
+    return summary
 
 
 if __name__ == '__main__':
+    if all_bots_locked():
+        log.info(u'Every bot account is locked, nothing to run')
+
+        importtime.report()
+        sys.exit(0)
+
+    import rollbar
+
     rollbar.init(config.ROLLBAR_TOKEN, 'production')  # access_token, environment
 
     try:
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding:Utf-8 -*-
+
+import time
+import random
+import signal
+import rollbar
+import config
+import threading
+
+from core import bot
+from core import cluster
+from core import metrics
+
+from run_bot import create_delivery_bot
+
+'''
+    Long running alternative to run_bot.py. Every bot keeps its session and lock
+    while the daemon runs and each phase runs on its own interval (in seconds).
+    Several daemons sharing the cache split the bots between them and take over
+    the bots of a daemon that stops heartbeating.
+
+    [
+        {
+            'owner_id': 1,
+            'use_2fa': True,
+            'only_use_special_emails': False,
+            'data_path': 'data/bot.json',
+            'send_interval': 60,
+            'accept_interval': 5 * 60,
+            'track_interval': 30 * 60
+        }
+    ]
+
+    Optional daemon settings
+
+    config.DAEMON_SCHEDULE_JITTER = 0.1  # intervals vary randomly by up to this fraction
+    config.DAEMON_LOCK_RENEW_SECONDS = 60  # bots without a lock retry taking it this often
+    config.NODE_ID = 'worker-1'  # defaults to hostname-pid
+    config.NODE_TIMEOUT_SECONDS = 90  # a daemon missing heartbeats this long loses its bots
+'''
+
+PHASE_INTERVALS = [
+    ('track_gifts', 'track_interval', 30 * 60),
+    ('accept_gifts', 'accept_interval', 5 * 60),
+    ('send_gifts', 'send_interval', 60)
+]
+
+DEFAULT_SCHEDULE_JITTER = 0.1
+DEFAULT_LOCK_RENEW_SECONDS = 60
+
+
+class PhaseSchedule(object):
+    def __init__(self, phase, interval, jitter):
+        self.phase = phase
+        self.interval = interval
+        self.jitter = jitter
+
+        # Every phase runs once right after startup
+
+        self.next_run_at = time.time()
+
+    def is_due(self, now):
+        return now >= self.next_run_at
+
+    def schedule_next(self, now):
+        self.next_run_at = now + self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class BotWorker(threading.Thread):
+    def __init__(self, BOT, stop_event, coordinator):
+        super(BotWorker, self).__init__(name=BOT['data_path'])
+
+        self.daemon = True
+        self.BOT = BOT
+        self.stop_event = stop_event
+        self.coordinator = coordinator
+        self.delivery_bot = create_delivery_bot(BOT)
+        self.web_account = self.delivery_bot.web_account
+        self.has_lock = False
+
+        jitter = getattr(config, 'DAEMON_SCHEDULE_JITTER', DEFAULT_SCHEDULE_JITTER)
+
+        self.schedules = [
+            PhaseSchedule(phase, BOT.get(interval_key, default_interval), jitter)
+            for phase, interval_key, default_interval in PHASE_INTERVALS
+        ]
+
+    def hold_lock(self):
+        # A held lease is renewed by its heartbeat, here it is only checked that it was not lost
+
+        if not self.coordinator.is_assigned(self.web_account.account_name):
+            self.drop_lock()
+
+            return False
+
+        if self.has_lock:
+            self.has_lock = self.web_account.lock_is_held()
+
+            return self.has_lock
+
+        if self.web_account.lock_is_present():
+            return False
+
+        self.has_lock = self.web_account.acquire_lock()
+
+        return self.has_lock
+
+    def drop_lock(self):
+        if self.has_lock:
+            bot.log.info(u'Handing {} over to another node'.format(self.web_account.account_name))
+
+            self.web_account.release_lock()
+            self.has_lock = False
+
+    def run_phase(self, phase):
+        bot.log.info(u'Running {0} for {1}'.format(phase, self.web_account.account_name))
+
+        try:
+            if phase == 'send_gifts':
+                self.delivery_bot.send_gifts(only_use_special_emails=self.BOT['only_use_special_emails'])
+            else:
+                getattr(self.delivery_bot, phase)()
+        except:
+            # catch-all, the phase runs again on its next schedule
+
+            bot.log.exception(u'{0} failed for {1}'.format(phase, self.web_account.account_name))
+            rollbar.report_exc_info()
+
+    def run_due_phases(self):
+        due_schedules = [schedule for schedule in self.schedules if schedule.is_due(time.time())]
+
+        if not due_schedules:
+            return
+
+        if not self.web_account.session:
+            self.web_account.init_session()
+
+        self.delivery_bot.begin_run()
+
+        for schedule in due_schedules:
+            if self.stop_event.is_set() or not self.hold_lock():
+                return
+
+            self.run_phase(schedule.phase)
+            schedule.schedule_next(time.time())
+
+    def run(self):
+        lock_renew_seconds = getattr(config, 'DAEMON_LOCK_RENEW_SECONDS', DEFAULT_LOCK_RENEW_SECONDS)
+
+        try:
+            while not self.stop_event.is_set():
+                if not self.hold_lock():
+                    bot.log.info(
+                        u'{} is locked or assigned to another node, waiting'.format(
+                            self.web_account.account_name
+                        )
+                    )
+
+                    self.stop_event.wait(lock_renew_seconds)
+
+                    continue
+
+                try:
+                    self.run_due_phases()
+                except:
+                    # catch-all, login failures are retried after a pause
+
+                    bot.log.exception(u'Bot {} failed'.format(self.web_account.account_name))
+                    rollbar.report_exc_info()
+
+                    self.stop_event.wait(lock_renew_seconds)
+
+                    continue
+
+                next_run_at = min(schedule.next_run_at for schedule in self.schedules)
+                self.stop_event.wait(max(min(next_run_at - time.time(), lock_renew_seconds), 1))
+        finally:
+            self.drop_lock()
+
+            self.web_account.log_rate_limit_waits()
+
+
+def run_daemon():
+    stop_event = threading.Event()
+
+    def stop(signum, frame):
+        bot.log.info(u'Received signal {}, stopping after the running phases'.format(signum))
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    coordinator = cluster.ClusterCoordinator()
+    coordinator.refresh()
+
+    heartbeat_seconds = getattr(config, 'NODE_HEARTBEAT_SECONDS', cluster.NODE_HEARTBEAT_SECONDS)
+    next_heartbeat_at = time.time() + heartbeat_seconds
+
+    workers = [BotWorker(BOT, stop_event, coordinator) for BOT in config.BOTS]
+
+    for worker in workers:
+        worker.start()
+
+    # Joining with a timeout keeps the main thread responsive to signals
+
+    try:
+        while any(worker.is_alive() for worker in workers):
+            if time.time() >= next_heartbeat_at:
+                try:
+                    coordinator.refresh()
+                    metrics.write_textfile(u'delivery_daemon_{}'.format(coordinator.node_id))
+                except Exception, e:
+                    bot.log.error(u'Could not refresh the cluster: {}'.format(e))
+
+                next_heartbeat_at = time.time() + heartbeat_seconds
+
+            for worker in workers:
+                worker.join(1)
+    finally:
+        coordinator.leave()
+
+
+if __name__ == '__main__':
+    rollbar.init(config.ROLLBAR_TOKEN, 'production')  # access_token, environment
+
+    try:
+        run_daemon()
+    except:
+        # catch-all
+
+        rollbar.report_exc_info()